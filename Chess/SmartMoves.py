@@ -1,36 +1,391 @@
-from chessEngine import Gamestate as gs
-piece_score = {"K":0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, "p" : 1, }
-CHECKMATE = 1000
+import time
+
+from Chess.chessEngine import PROMOTION_FLAG
+from Chess.evaluation import MG_PIECE_VALUES, evaluate
+from Chess.move_ordering import MoveOrderer
+from Chess.pawn_structure import PawnHashTable
+from Chess.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+CHECKMATE = 100000  # scores are in centipawns, a mate is worth more than any evaluation
 STALEMATE = 0
+DEPTH = 4
+MAX_PLY = 64  # deepest the search goes, counted in plies from the root
+MATE_BOUND = CHECKMATE - 1000  # scores beyond it are mates: tablebase mates can be further away than MAX_PLY
+MOVES_TO_GO = 30  # moves a clock is assumed to cover when the time control doesn't say
+SAFETY_MARGIN_MS = 50  # kept in reserve on the clock for move overhead
+NULL_MOVE_REDUCTION = 2  # plies the search after a null move is shortened by, one more from depth 7 on
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_FULL_DEPTH_MOVES = 3  # moves searched to full depth before the late quiet ones get reduced
+FUTILITY_MARGINS = (0, 200, 500)  # by depth left: how much a quiet move could gain at most near the leaves
+DELTA_MARGIN = 200  # a capture in the quiescence search must be able to get within this of alpha
+
+def format_score(score):
+    '''the score as UCI writes it: mate n in moves (negative when being mated), otherwise cp n'''
+    if abs(score) > MATE_BOUND:
+        plies = CHECKMATE - abs(score)
+        return f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+    return f"cp {score}"
+
+class SearchTimeout(Exception):
+    '''raised inside the search once the deadline has passed or stop() was called, unwinding back to the driver'''
+
+class Search():
+    '''
+    alpha-beta negamax search with a quiescence search on captures. The transposition table is kept between searches
+    since positions recur from one move to the next.
+    With lazy_legality the search works on pseudo legal moves and only tests a move for legality when it plays it, so
+    the moves left after a beta cutoff are never tested at all.
+    The selective parts of the search (null move pruning, late move reductions, futility and delta pruning, check
+    extensions) can each be switched off through its attribute, to measure what it saves
+    '''
+    def __init__(self, tt_size_mb=16, lazy_legality=True, tt=None):
+        self.lazy_legality = lazy_legality
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+        self.pawn_table = PawnHashTable()
+        self.ordering = MoveOrderer(MAX_PLY)
+        self.nodes = 0
+        self.deadline = None  # time.perf_counter() value after which the search gives up
+        self.stopped = False
+        self.stop_flag = None  # optional multiprocessing value shared with other processes, nonzero stops the search
+        self.completed_depth = 0
+        self.pv_ids = []  # move ids of the principal variation from the previous iteration
+        self.follow_pv = False
+        self.on_iteration = None  # optional callable(depth, score, nodes, pv), told about every completed iteration
+        self.tablebases = None  # optional Tablebases, the exact score of a position they cover ends the search there
+        self.stats = None  # optional SearchStats, filled in by every search while set
+        self.null_move = True
+        self.late_move_reductions = True
+        self.futility_pruning = True
+        self.delta_pruning = True
+        self.check_extensions = True
+
+    def stop(self):
+        '''ask a running search to return its best move so far, safe to call from another thread'''
+        self.stopped = True
+
+    def search(self, gs, validMoves, depth=None, time_ms=None, deadline=None, start_depth=1):
+        '''
+        iterative deepening: searches depth start_depth, start_depth + 1, ... up to depth (DEPTH when there is no time
+        limit) until time_ms milliseconds have passed or the deadline is reached. Returns the best move, its score for
+        the side to move and the principal variation of the deepest iteration that completed
+        '''
+        start = time.perf_counter()
+        if deadline is None and time_ms is not None:
+            deadline = start + time_ms / 1000
+        if depth is None:
+            depth = DEPTH if deadline is None else MAX_PLY
+        self.deadline = deadline
+        self.stopped = False
+        self.completed_depth = 0
+        self.pv_ids = []
+        self.tt.new_search()
+        self.ordering.new_search()
+        self.nodes = 0
+        moves_made = len(gs.movelog)
+        best = (validMoves[0] if validMoves else None), 0, []
+        stats = self.stats
+        if stats is not None:
+            stats.start_search(self, gs)
+        try:
+            for iteration_depth in range(min(start_depth, depth), depth + 1):
+                pv = []
+                self.follow_pv = True
+                try:
+                    score = self.nega_max_alpha_beta(gs, iteration_depth, -CHECKMATE - 1, CHECKMATE + 1, 0, pv,
+                                                     validMoves)
+                except SearchTimeout:
+                    while len(gs.movelog) > moves_made:  # the search was abandoned deep in the tree
+                        gs.undo_move()
+                    break
+                if pv:
+                    best = pv[0], score, pv
+                self.completed_depth = iteration_depth
+                self.pv_ids = [move.moveId for move in pv]
+                if stats is not None:
+                    stats.end_iteration(iteration_depth, self.nodes)
+                if self.on_iteration:
+                    self.on_iteration(iteration_depth, score, self.nodes, pv)
+                if abs(score) > MATE_BOUND:  # a forced mate was found, searching deeper won't change it
+                    break
+                if deadline is not None and time.perf_counter() - start > (deadline - start) / 2:
+                    break  # the next iteration would not finish in the time left
+        finally:
+            if stats is not None:
+                stats.end_search(self.nodes)
+        return best
 
-def find_best_move(gs, validMoves):
-    turn_multiplier = 1 if gs.white2move else -1
-    oppentMinMaxScore = -CHECKMATE
-    bestMove = None
-    for playerMove in validMoves:
-        gs.make_move(playerMove)
-        oppoentsMoves = gs.get_valid_moves()
-        for oppoentsMove in oppoentsMoves:
-            gs.make_move(oppoentsMove)
-            if gs.check_mate:
-                score = -CHECKMATE
-            elif gs.stale_mate:
-                score = STALEMATE
+    def check_time(self):
+        '''the first iteration always runs to completion so there is a move to play'''
+        if self.completed_depth and (self.stopped or (self.stop_flag is not None and self.stop_flag.value) or (
+                self.deadline is not None and time.perf_counter() > self.deadline)):
+            raise SearchTimeout()
+
+    def nega_max_alpha_beta(self, gs, depth, alpha, beta, ply, pv, validMoves=None, allow_null=True):
+        '''
+        score of the position for the side to move, searched depth plies further within the window (alpha, beta).
+        The moves of the best line found are written to pv. allow_null is False right after a null move, two passes in
+        a row would prove nothing
+        '''
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.check_time()
+        # a position repeated once is scored as the draw it can be made into. At the fifty move limit it is a draw
+        # unless the side to move is in check, then a mate still counts
+        if ply > 0 and (gs.halfmove_clock >= 4 and gs.repetitions() or
+                        gs.halfmove_clock >= 100 and not gs.king_in_check()):
+            return STALEMATE
+        alpha_orig = alpha
+        hash_move_id = 0
+        entry = self.tt.probe(gs.hash)
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, hash_move_id = entry
+            if tt_depth >= depth and ply > 0:  # the root always searches, it has to produce a move and a pv
+                tt_score = score_from_tt(tt_score, ply)
+                if tt_bound == EXACT or (tt_bound == LOWER_BOUND and tt_score >= beta) or (
+                        tt_bound == UPPER_BOUND and tt_score <= alpha):
+                    return tt_score
+        if self.tablebases is not None and ply > 0:
+            result = self.tablebases.probe(gs)
+            if result is not None:
+                return tablebase_score(result, ply)
+        in_check = None
+        if self.check_extensions and ply > 0:
+            in_check = gs.king_in_check()
+            if in_check and ply < MAX_PLY:  # a check is followed up instead of being cut off at the horizon
+                depth += 1
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+        if ply >= MAX_PLY:
+            return self.evaluate(gs)
+        if in_check is None:
+            in_check = gs.king_in_check()
+
+        static_eval = None
+        # null move pruning: if passing still leaves the side to move at or above beta after a shallower search, a real
+        # move would too. Not with only pawns left, where having to move can be what loses (zugzwang)
+        if (self.null_move and allow_null and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check and
+                not self.follow_pv and abs(beta) < MATE_BOUND and has_non_pawn_material(gs)):
+            static_eval = self.evaluate(gs)
+            if static_eval >= beta:
+                reduction = NULL_MOVE_REDUCTION + (1 if depth > 6 else 0)
+                gs.make_null_move()
+                score = -self.nega_max_alpha_beta(gs, depth - 1 - reduction, -beta, -beta + 1, ply + 1, [],
+                                                  allow_null=False)
+                gs.undo_move()
+                if score >= beta:
+                    return score if score < MATE_BOUND else beta  # a mate found after passing isn't a real one
+
+        # futility pruning: a frontier node this far below alpha only searches moves that change the material
+        futility_score = None
+        if self.futility_pruning and ply > 0 and depth < len(FUTILITY_MARGINS) and not in_check and (
+                abs(alpha) < MATE_BOUND):
+            if static_eval is None:
+                static_eval = self.evaluate(gs)
+            if static_eval + FUTILITY_MARGINS[depth] <= alpha:
+                futility_score = static_eval + FUTILITY_MARGINS[depth]
+        if validMoves is None:
+            validMoves = gs.pseudo_legal_moves() if self.lazy_legality else gs.get_valid_moves()
+        if self.follow_pv:  # still on the leftmost path, try the previous iteration's principal variation first
+            if ply < len(self.pv_ids):
+                hash_move_id = self.pv_ids[ply]
             else:
-                score = -turn_multiplier * score_material(gs.board)
-            if score > oppentMinMaxScore:
-                score = oppentMinMaxScore
-                bestMove = playerMove
-        gs.undo_move()
-    return bestMove
-
-def score_material(board):
-    score = 0
-    for row in board:
-        for square in row:
-            if square[0] == 'w':
-                score += piece_score[square[1]]
-            elif square[0] == 'b':
-                score -= piece_score[square[1]]
+                self.follow_pv = False
+
+        maxScore = -CHECKMATE - 1
+        bestMoveId = 0
+        legal_moves = 0
+        # the best move of an earlier search comes first, it most often causes the cutoff
+        for move in self.ordering.order_moves(validMoves, hash_move_id, ply):
+            child_pv = []
+            if self.lazy_legality and not gs.is_legal(move, in_check):
+                continue
+            gs.make_move(move)
+            legal_moves += 1
+            reduction = 0
+            if move.pieceCaptured == '--' and not move.flags & PROMOTION_FLAG and (futility_score is not None or (
+                    self.late_move_reductions and depth >= LMR_MIN_DEPTH and legal_moves > LMR_FULL_DEPTH_MOVES and
+                    not in_check)) and not gs.king_in_check():  # a quiet move that doesn't give check
+                if futility_score is not None:
+                    gs.undo_move()
+                    maxScore = max(maxScore, futility_score)  # the most it could score, still not above alpha
+                    continue
+                reduction = 1 if legal_moves <= 2 * LMR_FULL_DEPTH_MOVES else 2
+            if reduction:
+                # late move reduction: a quiet move ordered this late rarely turns out best, a shallower null
+                # window search shows whether it needs a full one
+                score = -self.nega_max_alpha_beta(gs, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1, child_pv)
+                if score > alpha:
+                    child_pv = []
+                    score = -self.nega_max_alpha_beta(gs, depth - 1, -beta, -alpha, ply + 1, child_pv)
+            else:
+                score = -self.nega_max_alpha_beta(gs, depth - 1, -beta, -alpha, ply + 1, child_pv)
+            gs.undo_move()
+            self.follow_pv = False
+            if score > maxScore:
+                maxScore = score
+                bestMoveId = move.moveId
+                if score > alpha:
+                    alpha = score
+                    pv[:] = [move] + child_pv
+                if alpha >= beta:  # the opponent will avoid this line, no need to look at the other moves
+                    self.ordering.record_cutoff(move, ply, depth)
+                    if self.stats is not None:
+                        self.stats.cutoff(legal_moves)
+                    break
+        if legal_moves == 0:
+            return -CHECKMATE + ply if in_check else STALEMATE
+        if maxScore <= alpha_orig:
+            bound = UPPER_BOUND
+        elif maxScore >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(gs.hash, depth, score_to_tt(maxScore, ply), bound, bestMoveId)
+        return maxScore
+
+    def evaluate(self, gs):
+        '''static evaluation for the side to move: piece-square score plus the pawn structure, cached by pawn hash'''
+        pawn_mg, pawn_eg = self.pawn_table.score(gs.pawn_hash, gs.bitboards['wp'], gs.bitboards['bp'])
+        score = evaluate(gs, pawn_mg, pawn_eg)
+        return score if gs.white2move else -score
+
+    def quiescence(self, gs, alpha, beta, ply):
+        '''
+        only captures and promotions are searched so the static evaluation is never taken in the middle of an exchange.
+        In check there is no standing pat, every evasion is searched and having none is mate
+        '''
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.check_time()
+        if self.stats is not None:
+            self.stats.qnodes += 1
+        self.follow_pv = False
+        if self.tablebases is not None:
+            result = self.tablebases.probe(gs)
+            if result is not None:
+                return tablebase_score(result, ply)
+        if ply >= MAX_PLY:
+            return self.evaluate(gs)
+        if gs.king_in_check():
+            validMoves = gs.get_valid_moves()  # evasions only
+            if len(validMoves) == 0:
+                return -CHECKMATE + ply
+            for move in self.ordering.order_moves(validMoves, 0, ply):
+                gs.make_move(move)
+                score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+                gs.undo_move()
+                if score >= beta:
+                    return score
+                alpha = max(alpha, score)
+            return alpha
+
+        stand_pat = self.evaluate(gs)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        for move in self.ordering.order_captures(gs.capture_moves()):
+            # delta pruning: skip a capture that can't bring the score near alpha even winning the piece for free
+            if self.delta_pruning and not move.flags & PROMOTION_FLAG and (
+                    stand_pat + MG_PIECE_VALUES[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha):
+                continue
+            if not gs.is_legal(move, False):
+                continue
+            gs.make_move(move)
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undo_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+default_search = Search()
+opening_book = None  # OpeningBook consulted by find_best_move before it searches, see set_opening_book
+parallel_search = None  # a ParallelSearch, started the first time find_best_move is asked for more than one worker
+
+def find_best_move(gs, validMoves, depth=None, time_ms=None, remaining_ms=None, increment_ms=0, moves_to_go=None,
+                   workers=1, use_book=True):
+    '''
+    returns the best move for the side to move and the principal variation starting with it. The search is limited
+    by depth, by a fixed time_ms per move, or by a budget taken from the remaining clock and increment.
+    With workers > 1 a Lazy SMP search runs on that many processes sharing one transposition table.
+    A move from the opening book, if one is set and has the position, is played without searching
+    '''
+    if use_book and opening_book is not None:
+        book_move = opening_book.choose_move(gs)
+        if book_move is not None:
+            return book_move, [book_move]
+    if time_ms is None and remaining_ms is not None:
+        time_ms = allocate_time(remaining_ms, increment_ms, moves_to_go)
+    if workers > 1:
+        bestMove, score, pv = get_parallel_search(workers).search(gs, validMoves, depth, time_ms)
+    else:
+        bestMove, score, pv = default_search.search(gs, validMoves, depth, time_ms)
+    return bestMove, pv
+
+def set_tablebases(directory):
+    '''probe the endgame tablebases in directory during the search, None to search without them'''
+    global parallel_search
+    from Chess.tablebase import Tablebases  # imported here like the book, Chess.tablebase imports the engine
+    if default_search.tablebases is not None:
+        default_search.tablebases.close()
+    default_search.tablebases = Tablebases(directory) if directory else None
+    if parallel_search is not None:  # restarted with the new tablebases the next time it is needed
+        parallel_search.close()
+        parallel_search = None
+
+def set_opening_book(path):
+    '''use the book file at path for find_best_move, None to play without a book'''
+    global opening_book
+    from Chess.book import OpeningBook  # imported here, Chess.book imports the engine
+    if opening_book is not None:
+        opening_book.close()
+    opening_book = OpeningBook(path) if path else None
+
+def get_parallel_search(workers):
+    '''the shared ParallelSearch, restarted if the number of workers changed'''
+    global parallel_search
+    from Chess.parallel import ParallelSearch  # imported here, Chess.parallel itself imports this module
+    if parallel_search is None or parallel_search.workers != workers:
+        if parallel_search is not None:
+            parallel_search.close()
+        tablebases = default_search.tablebases
+        parallel_search = ParallelSearch(workers, tablebase_path=tablebases.directory if tablebases else None)
+    return parallel_search
+
+def allocate_time(remaining_ms, increment_ms=0, moves_to_go=None):
+    '''
+    milliseconds to spend on this move: an even share of the clock over the moves left plus most of the increment,
+    never more than the clock minus a safety margin
+    '''
+    budget = remaining_ms / (moves_to_go or MOVES_TO_GO) + increment_ms * 0.8
+    return max(1, min(budget, remaining_ms - SAFETY_MARGIN_MS))
+
+def has_non_pawn_material(gs):
+    '''does the side to move have a knight, bishop, rook or queen'''
+    color = 'w' if gs.white2move else 'b'
+    bitboards = gs.bitboards
+    return bool(bitboards[color + 'N'] | bitboards[color + 'B'] | bitboards[color + 'R'] | bitboards[color + 'Q'])
+
+def tablebase_score(result, ply):
+    '''search score of a tablebase (result, plies to mate) found ply plies from the root'''
+    outcome, plies = result
+    if outcome > 0:
+        return CHECKMATE - ply - plies
+    if outcome < 0:
+        return -CHECKMATE + ply + plies
+    return STALEMATE
+
+def score_to_tt(score, ply):
+    '''mate scores are stored relative to the node, not the root, so they stay valid when reached at another ply'''
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
 
+def score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
     return score
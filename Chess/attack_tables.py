@@ -0,0 +1,72 @@
+"""
+Per-square attack tables, built once at import so the move generators and the pin/check detection never redo the
+offset and bounds arithmetic. All tables are indexed by square (row * 8 + col) and hold bitboards.
+"""
+from Chess.bitboards import BISHOP_DIRECTIONS, QUEEN_DIRECTIONS, ROOK_DIRECTIONS, king_attacks, knight_attacks, \
+    pawn_attacks, sliding_attacks
+
+KNIGHT_ATTACKS = [knight_attacks(1 << sq) for sq in range(64)]
+KING_ATTACKS = [king_attacks(1 << sq) for sq in range(64)]
+PAWN_ATTACKS = {color: [pawn_attacks(1 << sq, color) for sq in range(64)] for color in ('w', 'b')}
+
+# RAYS[direction][sq] is every square from sq to the edge of the board, sq itself excluded
+RAYS = {d: [sliding_attacks(sq, 0, (d,)) for sq in range(64)] for d in QUEEN_DIRECTIONS}
+# directions running towards higher square indexes find their first blocker at the lowest set bit, the others at the
+# highest set bit
+POSITIVE_DIRECTIONS = frozenset(d for d in QUEEN_DIRECTIONS if d[0] * 8 + d[1] > 0)
+
+# BETWEEN[a][b] is the squares strictly between a and b, LINE[a][b] the whole line through both; 0 if not aligned
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _d in QUEEN_DIRECTIONS:
+        _opposite = (-_d[0], -_d[1])
+        for _target in range(64):
+            if RAYS[_d][_sq] >> _target & 1:
+                BETWEEN[_sq][_target] = RAYS[_d][_sq] & RAYS[_opposite][_target]
+                LINE[_sq][_target] = RAYS[_d][_sq] | RAYS[_opposite][_sq] | 1 << _sq
+del _sq, _d, _opposite, _target
+
+
+ROOK_RAYS = tuple((RAYS[d], d in POSITIVE_DIRECTIONS) for d in ROOK_DIRECTIONS)
+BISHOP_RAYS = tuple((RAYS[d], d in POSITIVE_DIRECTIONS) for d in BISHOP_DIRECTIONS)
+
+
+def first_blocker(sq, occupied, d):
+    """the first occupied square from sq along direction d, or -1 if the ray is empty"""
+    blockers = RAYS[d][sq] & occupied
+    if not blockers:
+        return -1
+    if d in POSITIVE_DIRECTIONS:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def sliding_lookup(sq, occupied, rays):
+    """
+    attacks of a slider on sq: each precomputed ray is cut short by xoring off the ray behind its first blocker
+    """
+    attacks = 0
+    for ray_table, positive in rays:
+        ray = ray_table[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= ray_table[(blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return sliding_lookup(sq, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(sq, occupied):
+    return sliding_lookup(sq, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(sq, occupied):
+    return sliding_lookup(sq, occupied, ROOK_RAYS) | sliding_lookup(sq, occupied, BISHOP_RAYS)
+
+
+SLIDERS = {d: ('R', 'Q') for d in ROOK_DIRECTIONS}
+SLIDERS.update({d: ('B', 'Q') for d in BISHOP_DIRECTIONS})
@@ -0,0 +1,157 @@
+"""
+Batch analysis: searches every position of an EPD file, or every position reached in the games of a PGN file, and
+writes one result per position as JSON lines or CSV.
+
+    python -m Chess.batch positions.epd --depth 4 --output results.jsonl
+    python -m Chess.batch games.pgn --time-ms 500 --workers 8 --format csv --output results.csv --resume
+
+The input is read lazily and results are written as they come in, in input order, so memory use doesn't depend on
+the size of the input. With --resume the positions already in the output file are skipped and the run carries on
+after the last complete line.
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from Chess.chessEngine import STARTING_FEN, Gamestate
+from Chess.pgn import game_moves, read_games
+from Chess.SmartMoves import Search, format_score
+
+FIELDS = ("index", "id", "fen", "bestmove", "score", "depth", "nodes", "time_ms", "pv")
+BATCH_PER_WORKER = 16  # positions handed to the pool at a time per worker, bounds how far reading runs ahead
+
+_search = None  # the Search of this process, kept from one position to the next
+
+
+def read_epd(lines):
+    """yield (id, fen) for each EPD record, the move counters come from the hmvc and fmvn operations if present"""
+    for line in lines:
+        fields = line.split(None, 4)
+        if len(fields) < 4 or line.startswith('#'):
+            continue
+        operations = fields[4] if len(fields) > 4 else ''
+        ops = dict(re.findall(r'(\w+)\s+("[^"]*"|[^;]*);', operations))
+        position_id = ops.get('id', '').strip('"')
+        yield position_id, " ".join(fields[:4] + [ops.get('hmvc', '0').strip(), ops.get('fmvn', '1').strip()])
+
+
+def read_pgn(lines):
+    """yield (id, fen) for every position in every game, the start position included. id is game number:ply"""
+    for game, (tags, movetext) in enumerate(read_games(lines), 1):
+        fen = tags.get('FEN', STARTING_FEN)
+        yield f"{game}:0", fen
+        gs = Gamestate.from_fen(fen)
+        for ply, move in enumerate(game_moves(gs, movetext), 1):
+            gs.make_move(move)
+            yield f"{game}:{ply}", gs.to_fen()
+
+
+def read_positions(path):
+    """(id, fen) for every position in the file, read lazily"""
+    with open(path) as lines:
+        yield from (read_pgn(lines) if path.lower().endswith('.pgn') else read_epd(lines))
+
+
+def init_worker():
+    global _search
+    _search = Search()
+
+
+def analyze(task):
+    """search one position: task is (index, id, fen, depth, time_ms), returns the result record"""
+    index, position_id, fen, depth, time_ms = task
+    if _search is None:
+        init_worker()
+    start = time.perf_counter()
+    gs = Gamestate.from_fen(fen)
+    validMoves = gs.get_valid_moves()
+    if validMoves:
+        best_move, score, pv = _search.search(gs, validMoves, depth, time_ms)
+        nodes = _search.nodes
+    else:
+        best_move, score, pv, nodes = None, 0, [], 0
+    return {"index": index, "id": position_id, "fen": fen,
+            "bestmove": best_move.get_chess_notation() if best_move else None,
+            "score": format_score(score) if best_move else None, "depth": _search.completed_depth if best_move else 0,
+            "nodes": nodes, "time_ms": round((time.perf_counter() - start) * 1000),
+            "pv": " ".join(move.get_chess_notation() for move in pv)}
+
+
+def completed_lines(path, has_header):
+    """
+    number of results already in the output file. A last line cut off part way is removed so it gets written again
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) != len(data):
+            f.truncate(len(complete))
+    lines = complete.count(b'\n')
+    return max(0, lines - 1) if has_header else lines
+
+
+def run(input_path, output, depth=None, time_ms=None, workers=1, fmt="jsonl", skip=0, write_header=True):
+    """analyze the input, skipping its first skip positions, and write each result to the output file object"""
+    tasks = ((index, position_id, fen, depth, time_ms)
+             for index, (position_id, fen) in enumerate(itertools.islice(read_positions(input_path), skip, None), skip))
+    if fmt == "csv":
+        writer = csv.DictWriter(output, FIELDS)
+        if write_header:
+            writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            output.write(json.dumps(record) + "\n")
+    count = 0
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+            while True:
+                # a bounded slice at a time: Pool.imap would otherwise read the whole input ahead of the workers
+                batch = list(itertools.islice(tasks, workers * BATCH_PER_WORKER))
+                if not batch:
+                    break
+                for record in pool.imap(analyze, batch):
+                    write(record)
+                    output.flush()
+                    count += 1
+    else:
+        for task in tasks:
+            write(analyze(task))
+            output.flush()
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="analyze every position of an EPD or PGN file")
+    parser.add_argument("input", help="EPD file, or PGN file (every position of every game)")
+    parser.add_argument("--depth", type=int, help="search depth per position")
+    parser.add_argument("--time-ms", type=int, help="search time per position in milliseconds")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default 1)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="output format (default: from the output name)")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--resume", action="store_true", help="skip the positions already in the output file")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.output and args.output.endswith(".csv") else "jsonl")
+    if args.output is None:
+        run(args.input, sys.stdout, args.depth, args.time_ms, args.workers, fmt)
+        return 0
+    skip = completed_lines(args.output, fmt == "csv") if args.resume else 0
+    resuming = args.resume and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+    with open(args.output, "a" if resuming else "w", newline="") as output:
+        count = run(args.input, output, args.depth, args.time_ms, args.workers, fmt, skip, not resuming)
+    print(f"{count} positions analyzed" + (f", {skip} already done" if skip else ""), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Helpers for the bitboard representation of the position. Every piece type and colour is kept as one 64 bit integer with
+a bit set for each square holding that piece. Square index is row * 8 + col, so bit 0 is a8 and bit 63 is h1, matching
+the (row, col) layout of Gamestate.board.
+"""
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = NOT_FILE_A & (NOT_FILE_A << 1)
+NOT_FILE_GH = NOT_FILE_H & (NOT_FILE_H >> 1)
+
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def iter_bits(bb):
+    """yield the index of every set bit, lowest first"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def pop_count(bb):
+    return bin(bb).count("1")
+
+
+def knight_attacks(bb):
+    """all squares attacked by the knights in bb"""
+    return ((bb >> 17 & NOT_FILE_H) | (bb >> 15 & NOT_FILE_A) | (bb >> 10 & NOT_FILE_GH) | (bb >> 6 & NOT_FILE_AB) |
+            (bb << 6 & NOT_FILE_GH) | (bb << 10 & NOT_FILE_AB) | (bb << 15 & NOT_FILE_H) |
+            (bb << 17 & NOT_FILE_A)) & FULL
+
+
+def king_attacks(bb):
+    """all squares attacked by the kings in bb"""
+    sideways = (bb >> 1 & NOT_FILE_H) | (bb << 1 & NOT_FILE_A)
+    row = bb | sideways
+    return (sideways | row >> 8 | row << 8) & FULL
+
+
+def pawn_attacks(bb, color):
+    """all squares attacked by the pawns of the given colour ('w' or 'b') in bb"""
+    if color == "w":  # white pawns move up the board, towards row 0
+        return (bb >> 9 & NOT_FILE_H) | (bb >> 7 & NOT_FILE_A)
+    return ((bb << 7 & NOT_FILE_H) | (bb << 9 & NOT_FILE_A)) & FULL
+
+
+def sliding_attacks(sq, occupied, directions):
+    """squares reached from sq along each direction, stopping at (and including) the first occupied square"""
+    attacks = 0
+    r, c = sq >> 3, sq & 7
+    for dr, dc in directions:
+        end_row, end_col = r + dr, c + dc
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            target = 1 << (end_row * 8 + end_col)
+            attacks |= target
+            if occupied & target:
+                break
+            end_row += dr
+            end_col += dc
+    return attacks
@@ -0,0 +1,164 @@
+"""
+Polyglot opening books (.bin): a file of 16 byte entries (key, move, weight, learn; big endian) sorted by position key,
+any number of entries per position. The file is memory mapped and looked up with a binary search on the key, so opening
+a book costs nothing however big it is and only the pages touched by a lookup are read.
+
+The key is the standard Polyglot one (polyglot_key), so any Polyglot book can be used, and books built from PGN games
+with this module work in other engines too:
+
+    python -m Chess.book build games.pgn book.bin --plies 20
+    python -m Chess.book probe book.bin ["<fen>"]
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+from Chess.chessEngine import CASTLE_FLAG, STARTING_FEN, Gamestate
+from Chess.pgn import game_moves, read_games
+from Chess.polyglot_random import RANDOM64
+
+ENTRY = struct.Struct('>QHHI')  # key, move, weight, learn
+MAX_WEIGHT = 0xFFFF
+# index of each piece's keys in RANDOM64, in blocks of 64
+PIECE_KINDS = {'bp': 0, 'wp': 1, 'bN': 2, 'wN': 3, 'bB': 4, 'wB': 5, 'bR': 6, 'wR': 7, 'bQ': 8, 'wQ': 9, 'bK': 10,
+               'wK': 11}
+CASTLE_OFFSET = 768
+ENPASSANT_OFFSET = 772
+TURN_OFFSET = 780
+
+
+def polyglot_key(gs):
+    """
+    Polyglot key of the position. Unlike Gamestate.hash it includes the en passant file only when a pawn of the side
+    to move stands next to the pawn that just pushed, whether or not the capture would be legal
+    """
+    key = 0
+    for r, row in enumerate(gs.board):
+        for c, piece in enumerate(row):
+            if piece != "--":
+                key ^= RANDOM64[64 * PIECE_KINDS[piece] + (7 - r) * 8 + c]
+    rights = gs.current_castle_right
+    for i, held in enumerate((rights.wks, rights.wqs, rights.bks, rights.bqs)):
+        if held:
+            key ^= RANDOM64[CASTLE_OFFSET + i]
+    if gs.enpassant_possible:
+        row, col = gs.enpassant_possible
+        pawn_row, pawn = (row + 1, 'wp') if gs.white2move else (row - 1, 'bp')  # where a capturing pawn would be
+        if any(0 <= c < 8 and gs.board[pawn_row][c] == pawn for c in (col - 1, col + 1)):
+            key ^= RANDOM64[ENPASSANT_OFFSET + col]
+    if gs.white2move:
+        key ^= RANDOM64[TURN_OFFSET]
+    return key
+
+
+def encode_move(move):
+    """
+    Polyglot move: to file in bits 0-2, to rank in 3-5, from file in 6-8, from rank in 9-11 (ranks counted from
+    white's side), promotion piece in 12-14. Castling is written as the king taking its own rook
+    """
+    start = move.moveId & 63
+    end = move.moveId >> 6 & 63
+    if move.flags & CASTLE_FLAG:
+        end = end & ~7 | (7 if end & 7 == 6 else 0)
+    return ((end & 7) | (7 - (end >> 3)) << 3 | (start & 7) << 6 | (7 - (start >> 3)) << 9 |
+            (move.moveId >> 12) << 12)
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        if os.path.getsize(path) == 0:  # an empty file can't be mapped, it is simply a book without entries
+            self.data = b''
+        else:
+            with open(path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.data) // ENTRY.size
+
+    def entries(self, key):
+        """(move, weight) of every entry stored for the key"""
+        lo, hi = 0, self.size
+        while lo < hi:  # first entry with an entry key >= key
+            mid = (lo + hi) // 2
+            if ENTRY.unpack_from(self.data, mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        while lo < self.size:
+            entry_key, move, weight, learn = ENTRY.unpack_from(self.data, lo * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((move, weight))
+            lo += 1
+        return result
+
+    def moves(self, gs):
+        """[(move, weight)] of the book moves in the position that are legal, with the weights stored for them"""
+        stored = dict(self.entries(polyglot_key(gs)))
+        if not stored:
+            return []
+        return [(move, stored[encode_move(move)]) for move in gs.get_valid_moves() if encode_move(move) in stored]
+
+    def choose_move(self, gs, rng=random):
+        """a book move picked at random in proportion to its weight, or None when the position isn't in the book"""
+        moves = [(move, weight) for move, weight in self.moves(gs) if weight > 0]
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def build(pgn_path, book_path, plies=20):
+    """
+    write a book of the first plies moves of every game in the PGN file. A move's weight is 2 for every game the side
+    playing it won and 1 for every draw, the Polyglot convention, and games without a result count as draws
+    """
+    weights = {}
+    with open(pgn_path) as lines:
+        for tags, movetext in read_games(lines):
+            result = tags.get('Result', '*')
+            gs = Gamestate.from_fen(tags.get('FEN', STARTING_FEN))
+            for ply, move in enumerate(game_moves(gs, movetext)):
+                if ply >= plies:
+                    break
+                won = result == ('1-0' if gs.white2move else '0-1')
+                lost = result == ('0-1' if gs.white2move else '1-0')
+                entry = (polyglot_key(gs), encode_move(move))
+                weights[entry] = weights.get(entry, 0) + (2 if won else 0 if lost else 1)
+                gs.make_move(move)
+    with open(book_path, 'wb') as f:
+        for (key, move), weight in sorted(weights.items()):
+            f.write(ENTRY.pack(key, move, min(weight, MAX_WEIGHT), 0))
+    return len(weights)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build or look up an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build a book from the opening moves of a PGN file")
+    build_parser.add_argument("pgn")
+    build_parser.add_argument("book")
+    build_parser.add_argument("--plies", type=int, default=20, help="moves per game to include (default 20)")
+    probe_parser = commands.add_parser("probe", help="list the book moves in a position")
+    probe_parser.add_argument("book")
+    probe_parser.add_argument("fen", nargs="?", default=STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"{build(args.pgn, args.book, args.plies)} entries written to {args.book}")
+    else:
+        book = OpeningBook(args.book)
+        for move, weight in sorted(book.moves(Gamestate.from_fen(args.fen)), key=lambda m: -m[1]):
+            print(f"{move.get_chess_notation()} {weight}")
+        book.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
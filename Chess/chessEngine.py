@@ -2,13 +2,41 @@
 This class is responsible for storing all the information about the current state of a chess game. Also responsible for
  determing the valid moves at the current state. It will also keep a move log.
 """
-import chess
+from Chess.attack_tables import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, LINE, PAWN_ATTACKS, SLIDERS, bishop_attacks, \
+    first_blocker, rook_attacks
+from Chess.bitboards import FULL, PIECES, QUEEN_DIRECTIONS, iter_bits, king_attacks, knight_attacks, pawn_attacks
+from Chess.evaluation import EG_VALUES, MG_VALUES, PHASE, evaluate_from_scratch
+from Chess.zobrist import PIECE_KEYS, WHITE_TO_MOVE_KEY, castle_key, enpassant_key, hash_position, \
+    pawn_hash_position
+
+# Move.flags bits
+ENPASSANT_FLAG = 1
+CASTLE_FLAG = 2
+PROMOTION_FLAG = 4
+# promotion piece, stored in bits 12-14 of Move.moveId
+PROMOTION_PIECES = ('', 'N', 'B', 'R', 'Q')
+# castling rights bits
+WKS, WQS, BKS, BQS = 1, 2, 4, 8
+# rights kept by a move from or to each square: moving the king or a rook, or taking a rook, loses them
+CASTLE_MASKS = [15] * 64
+CASTLE_MASKS[0], CASTLE_MASKS[4], CASTLE_MASKS[7] = 15 & ~BQS, 15 & ~(BKS | BQS), 15 & ~BKS
+CASTLE_MASKS[56], CASTLE_MASKS[60], CASTLE_MASKS[63] = 15 & ~WQS, 15 & ~(WKS | WQS), 15 & ~WKS
+# the undo stack holds per move what it can't be undone from: castling bits, enpassant square, halfmove clock and hash
+UNDO_SLOTS = 4
+UNDO_STACK_MOVES = 256  # moves there is room for at first, the stack doubles when a game runs longer
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# FEN piece letter to board piece string and back
+FEN_PIECES = {'P': 'wp', 'N': 'wN', 'B': 'wB', 'R': 'wR', 'Q': 'wQ', 'K': 'wK',
+              'p': 'bp', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'}
+PIECE_LETTERS = {piece: letter for letter, piece in FEN_PIECES.items()}
 
 
 class Gamestate():
     white2move: bool
 
-    def __init__(self):
+    def __init__(self, fen=None):
+        """the starting position, or the position of a FEN string (see from_fen)"""
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
@@ -25,146 +53,378 @@ class Gamestate():
                               'K': self.get_king_moves}
         self.white2move = True
         self.movelog = []
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
         self.inCheck = False
         self.pins = []
         self.checks = []
+        self.attacked = 0  # squares the opponent attacks, set by get_valid_moves for the king and castling moves
         self.check_mate = False
         self.stale_mate = False
+        self.trace = None  # optional callable given diagnostic messages, e.g. print. None keeps the engine silent
         self.enpassant_possible = ()  # the square where an enpassant capture is possible
         self.current_castle_right = castle_rights(True, True, True, True)
-        self.castle_right_log = [castle_rights(self.current_castle_right.wks, self.current_castle_right.wqs,
-                                               self.current_castle_right.bks, self.current_castle_right.bqs)]
+        self.halfmove_clock = 0  # plies since the last capture or pawn move, for the fifty move rule
+        self.fullmove_number = 1  # starts at 1 and goes up after each black move
+        if fen is not None:
+            self.read_fen(fen)
+        self.setup_position()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        a Gamestate set up from a FEN string. The move counters may be left off, they default to 0 and 1
+        """
+        return cls(fen)
+
+    def read_fen(self, fen):
+        """
+        take board, side to move, castling rights, enpassant square and move counters from a FEN string, raising
+        ValueError if it is malformed. setup_position has to follow
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"FEN needs at least 4 fields: {fen!r}")
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"FEN placement needs 8 ranks: {fen!r}")
+        board = []
+        for rank in ranks:
+            row = []
+            for symbol in rank:
+                if symbol.isdigit():
+                    row.extend(["--"] * int(symbol))
+                elif symbol in FEN_PIECES:
+                    row.append(FEN_PIECES[symbol])
+                else:
+                    raise ValueError(f"unknown piece {symbol!r} in FEN: {fen!r}")
+            if len(row) != 8:
+                raise ValueError(f"FEN rank {rank!r} isn't 8 squares: {fen!r}")
+            board.append(row)
+        for king in ("wK", "bK"):
+            if sum(row.count(king) for row in board) != 1:
+                raise ValueError(f"FEN needs exactly one king of each colour: {fen!r}")
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"FEN side to move must be w or b: {fen!r}")
+        self.board = board
+        self.white2move = fields[1] == 'w'
+        castling = fields[2]
+        # a right only stands with the king on its home square and the rook in that corner, otherwise it is dropped
+        self.current_castle_right = castle_rights(
+            *(right in castling and board[row][4] == color + 'K' and board[row][col] == color + 'R'
+              for right, color, row, col in (('K', 'w', 7, 7), ('Q', 'w', 7, 0), ('k', 'b', 0, 7), ('q', 'b', 0, 0))))
+        enpassant = fields[3]
+        if enpassant == '-':
+            self.enpassant_possible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.files2Cols and enpassant[1] in Move.ranks2Rows:
+            self.enpassant_possible = (Move.ranks2Rows[enpassant[1]], Move.files2Cols[enpassant[0]])
+        else:
+            raise ValueError(f"bad FEN enpassant square {enpassant!r}: {fen!r}")
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+    def to_fen(self):
+        """the position as a FEN string"""
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += PIECE_LETTERS[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.current_castle_right
+        castling = ('K' if rights.wks else '') + ('Q' if rights.wqs else '') + ('k' if rights.bks else '') + (
+            'q' if rights.bqs else '')
+        if self.enpassant_possible:
+            enpassant = Move.cols2files[self.enpassant_possible[1]] + Move.rows2ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = '-'
+        return (f"{'/'.join(ranks)} {'w' if self.white2move else 'b'} {castling or '-'} {enpassant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def setup_position(self):
+        """
+        rebuild everything derived from board, white2move, current_castle_right and enpassant_possible: the king
+        locations, the move log and undo stack, the bitboards and the hash. Called once a position has been set up
+        directly
+        """
+        self.movelog = []
+        # the state before each move of movelog, UNDO_SLOTS entries per move, allocated once rather than per move
+        self.undo_stack = [0] * (UNDO_STACK_MOVES * UNDO_SLOTS)
+        # bitboards, one 64 bit int per piece plus occupancy masks, kept in step with self.board by set_square
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.color_occupancy = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    bit = 1 << (r * 8 + c)
+                    self.bitboards[piece] |= bit
+                    self.color_occupancy[piece[0]] |= bit
+                    if piece == "wK":
+                        self.whiteKingLocation = (r, c)
+                    elif piece == "bK":
+                        self.blackKingLocation = (r, c)
+        self.occupied = self.color_occupancy['w'] | self.color_occupancy['b']
+        # zobrist key of the position, updated incrementally by make_move and restored by undo_move
+        self.hash = hash_position(self)
+        self.pawn_hash = pawn_hash_position(self)  # pawns only, kept up to date by set_square (undo included)
+        # evaluation terms, kept up to date by set_square so evaluation.evaluate is O(1)
+        self.mg_score, self.eg_score, self.phase = evaluate_from_scratch(self.board)
+
+    def set_square(self, sq, piece):
+        """
+        Put piece (or '--' to empty it) on square sq (row * 8 + col), updating the bitboards and the evaluation terms
+        incrementally
+        """
+        row = self.board[sq >> 3]
+        old_piece = row[sq & 7]
+        self.mg_score += MG_VALUES[piece][sq] - MG_VALUES[old_piece][sq]
+        self.eg_score += EG_VALUES[piece][sq] - EG_VALUES[old_piece][sq]
+        self.phase += PHASE[piece] - PHASE[old_piece]
+        bit = 1 << sq
+        if old_piece != "--":
+            self.bitboards[old_piece] ^= bit
+            self.color_occupancy[old_piece[0]] ^= bit
+            self.hash ^= PIECE_KEYS[old_piece][sq]
+            if old_piece[1] == 'p':
+                self.pawn_hash ^= PIECE_KEYS[old_piece][sq]
+        if piece != "--":
+            self.bitboards[piece] |= bit
+            self.color_occupancy[piece[0]] |= bit
+            self.hash ^= PIECE_KEYS[piece][sq]
+            if piece[1] == 'p':
+                self.pawn_hash ^= PIECE_KEYS[piece][sq]
+        row[sq & 7] = piece
+        self.occupied = self.color_occupancy['w'] | self.color_occupancy['b']
 
     def make_move(self, move):
         """Takes a move as parameter and execute it """
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        start = move.moveId & 63
+        end = move.moveId >> 6 & 63
+        flags = move.flags
+        piece = move.pieceMoved
+        self.push_undo()
+        if piece[1] == 'p' or move.pieceCaptured != '--':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if piece[0] == 'b':
+            self.fullmove_number += 1
+        self.set_square(start, "--")
+        self.set_square(end, piece)
         self.movelog.append(move)
         self.white2move = not self.white2move  # swap players
+        self.hash ^= WHITE_TO_MOVE_KEY
         # update king's position
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if piece == "wK":
+            self.whiteKingLocation = (end >> 3, end & 7)
+        elif piece == "bK":
+            self.blackKingLocation = (end >> 3, end & 7)
         # pawn promotion
-        if move.is_pawn_promotion:
-            promoted_piece = input("Promote to Q, R, B or K : ")
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promoted_piece
+        if flags & PROMOTION_FLAG:
+            self.set_square(end, piece[0] + PROMOTION_PIECES[move.moveId >> 12])
 
         # En passant
-        if move.is_enpassant_move:
-            self.board[move.startRow][move.endCol] = '--'  # capture the pawn
+        if flags & ENPASSANT_FLAG:
+            self.set_square(start & ~7 | end & 7, '--')  # capture the pawn, on the start row and the end column
 
         # update enpassant possible variable
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpassant_possible = ((move.startRow + move.endRow) // 2, move.startCol)
+        self.hash ^= enpassant_key(self.enpassant_possible)
+        if piece[1] == 'p' and abs(start - end) == 16:
+            self.enpassant_possible = ((start + end) >> 4, start & 7)
         else:
             self.enpassant_possible = ()
+        self.hash ^= enpassant_key(self.enpassant_possible)
 
         # castle move
-        if move.is_castle_move:
-            if move.endCol - move.startCol == 2:  # king side castle move
-                self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]  # move the rook
-                self.board[move.endRow][move.endCol + 1] = '--'  # erase the rook
-
-
+        if flags & CASTLE_FLAG:
+            if end - start == 2:  # king side castle move
+                self.set_square(end - 1, self.board[end >> 3][(end & 7) + 1])  # move the rook
+                self.set_square(end + 1, '--')  # erase the rook
             else:
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]  # move the rook
-                self.board[move.endRow][move.endCol - 2] = '--'  # erase the rook
+                self.set_square(end + 1, self.board[end >> 3][(end & 7) - 2])  # move the rook
+                self.set_square(end - 2, '--')  # erase the rook
 
         # update castling rights - whenever it is a rook or king move
+        castling = self.current_castle_right.bits
         self.update_castle_right(move)
-        self.castle_right_log.append(castle_rights(self.current_castle_right.wks, self.current_castle_right.wqs,
-                                                   self.current_castle_right.bks, self.current_castle_right.bqs))
+        if self.current_castle_right.bits != castling:
+            self.hash ^= castle_key(castling) ^ castle_key(self.current_castle_right.bits)
+
+    def make_null_move(self):
+        """
+        pass the move to the opponent, for null move pruning in the search. It goes on the move log as None, so
+        undo_move takes it back like any other move
+        """
+        self.push_undo()
+        self.halfmove_clock = 0  # no repetition reaches back past a pass
+        self.hash ^= WHITE_TO_MOVE_KEY ^ enpassant_key(self.enpassant_possible)
+        self.enpassant_possible = ()
+        self.white2move = not self.white2move
+        self.movelog.append(None)
+
+    def push_undo(self):
+        """save the state the next move can't be undone from, in the undo stack slots of its index in movelog"""
+        stack = self.undo_stack
+        i = len(self.movelog) * UNDO_SLOTS
+        if i == len(stack):
+            stack.extend([0] * len(stack))
+        stack[i] = self.current_castle_right.bits
+        stack[i + 1] = self.enpassant_possible
+        stack[i + 2] = self.halfmove_clock
+        stack[i + 3] = self.hash
 
     def undo_move(self):
-        if len(self.movelog) != 0:
-            move = self.movelog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+        if len(self.movelog) == 0:
+            return
+        move = self.movelog.pop()
+        if move is None:  # a null move
+            self.white2move = not self.white2move
+        else:
+            start = move.moveId & 63
+            end = move.moveId >> 6 & 63
+            flags = move.flags
+            self.set_square(start, move.pieceMoved)
+            self.set_square(end, move.pieceCaptured)
             self.white2move = not self.white2move
+            # update king's position
+            if move.pieceMoved == "wK":
+                self.whiteKingLocation = (start >> 3, start & 7)
+            elif move.pieceMoved == "bK":
+                self.blackKingLocation = (start >> 3, start & 7)
             # undo enpassant
-            if move.is_enpassant_move:
-                self.board[move.startRow][move.startCol] = '--'
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassant_possible = (move.endRow, move.endCol)
-            # undo 2 squares pawn advance
-            if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-                self.enpassant_possible = ()
-
-            # undo castling rights
-            self.castle_right_log.pop()
-            self.current_castle_right = self.castle_right_log[-1]
-
+            if flags & ENPASSANT_FLAG:
+                self.set_square(end, '--')  # the captured pawn wasn't on the landing square
+                self.set_square(start & ~7 | end & 7, move.pieceCaptured)
             # undo castle move
-            if move.is_castle_move:
-                if move.endCol - move.startCol == 2:  # king side
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = "--"
-
+            if flags & CASTLE_FLAG:
+                if end - start == 2:  # king side
+                    self.set_square(end + 1, self.board[end >> 3][(end & 7) - 1])
+                    self.set_square(end - 1, "--")
                 else:
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = "--"
+                    self.set_square(end - 2, self.board[end >> 3][(end & 7) + 1])
+                    self.set_square(end + 1, "--")
+            if move.pieceMoved[0] == 'b':
+                self.fullmove_number -= 1
+        # castling rights, enpassant square, halfmove clock and hash as they were before the move
+        stack = self.undo_stack
+        i = len(self.movelog) * UNDO_SLOTS
+        self.current_castle_right.bits = stack[i]
+        self.enpassant_possible = stack[i + 1]
+        self.halfmove_clock = stack[i + 2]
+        self.hash = stack[i + 3]
+
+    def repetitions(self):
+        """
+        how many times the position occurred before in the game. Only positions since the last capture or pawn move
+        (or null move) can repeat, so the hashes are scanned back no further than the halfmove clock
+        """
+        plies = len(self.movelog)
+        stack = self.undo_stack
+        count = 0
+        # the same side to move, 4 plies back at the nearest
+        for ply in range(plies - 4, max(plies - self.halfmove_clock, 0) - 1, -2):
+            if stack[ply * UNDO_SLOTS + 3] == self.hash:
+                count += 1
+        return count
+
+    def is_draw(self):
+        """draw by threefold repetition or the fifty move rule, a checkmate on the last move is still a checkmate"""
+        return self.repetitions() >= 2 or self.halfmove_clock >= 100
 
     def update_castle_right(self, move):
         ''' update the castle right given the move'''
-        if move.pieceMoved == 'wk':
-            self.current_castle_right.wks = False
-            self.current_castle_right.wqs = False
-        elif move.pieceMoved == 'bk':
-            self.current_castle_right.bks = False
-            self.current_castle_right.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:  # left rook
-                    self.current_castle_right.wqs = False
-                elif move.startCol == 7:  # right rook
-                    self.current_castle_right.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.current_castle_right.bqs = False
-                elif move.startCol == 7:  # righ rook
-                    self.current_castle_right.bks = False
-        # if rook has been captured
-        if move.pieceCaptured == 'wR':
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.current_castle_right.wqs = False
-                elif move.endCol == 7:
-                    self.current_castle_right.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.current_castle_right.bqs = False
-                elif move.endCol == 7:
-                    self.current_castle_right.bks = False
+        # a king or rook leaving its start square, or a rook taken on it, loses the rights of that square
+        self.current_castle_right.bits &= CASTLE_MASKS[move.moveId & 63] & CASTLE_MASKS[move.moveId >> 6 & 63]
 
     def squareUnderAttack(self, row, col):
         """
         Determine if enemy can attack the square row col
         """
-        self.white2move = not self.white2move  # switch to opponent's point of view
-        opponents_moves = self.possible_moves()
-        self.white2move = not self.white2move
-        for move in opponents_moves:
-            if move.endRow == row and move.endCol == col: # square is under attack
+        return self.square_attacked(row * 8 + col, 'b' if self.white2move else 'w')
+
+    def square_attacked(self, sq, by_color):
+        """True if any of by_color's pieces attacks square sq"""
+        # look outwards from the square for each kind of piece, pawns included even when the square is empty
+        bitboards = self.bitboards
+        queens = bitboards[by_color + 'Q']
+        return bool(KNIGHT_ATTACKS[sq] & bitboards[by_color + 'N'] or
+                    PAWN_ATTACKS['b' if by_color == 'w' else 'w'][sq] & bitboards[by_color + 'p'] or
+                    KING_ATTACKS[sq] & bitboards[by_color + 'K'] or
+                    rook_attacks(sq, self.occupied) & (bitboards[by_color + 'R'] | queens) or
+                    bishop_attacks(sq, self.occupied) & (bitboards[by_color + 'B'] | queens))
+
+    def king_in_check(self):
+        """True if the side to move is in check"""
+        if self.white2move:
+            return self.square_attacked(self.whiteKingLocation[0] * 8 + self.whiteKingLocation[1], 'b')
+        return self.square_attacked(self.blackKingLocation[0] * 8 + self.blackKingLocation[1], 'w')
 
-                print(
-                    f"Move from {move.startRow}, {move.startCol} to {move.endRow}, {move.endCol} is considered as an attack.")
+    def is_legal(self, move, in_check=True):
+        """
+        True if a pseudo legal move doesn't leave the mover's own king attacked, tested without playing the move.
+        in_check=False (the side to move is known not to be in check) lets most moves through without any lookups
+        """
+        start = move.moveId & 63
+        end = move.moveId >> 6 & 63
+        if self.white2move:
+            ally_color, enemy_color, kingRow, kingCol = 'w', 'b', *self.whiteKingLocation
+        else:
+            ally_color, enemy_color, kingRow, kingCol = 'b', 'w', *self.blackKingLocation
+        if move.pieceMoved[1] == 'K':
+            king_sq = end
+        else:
+            king_sq = kingRow * 8 + kingCol
+            # a piece off every line through the king can't be pinned, so it can't expose the king
+            if not in_check and not LINE[king_sq][start] and not move.flags & ENPASSANT_FLAG:
                 return True
-        return False
+        # the board as it would be after the move: the piece has left start, stands on end and took what was there
+        occupied = self.occupied & ~(1 << start) | 1 << end
+        enemies = self.color_occupancy[enemy_color] & ~(1 << end)
+        if move.flags & ENPASSANT_FLAG:
+            captured = 1 << (start & ~7 | end & 7)
+            occupied &= ~captured
+            enemies &= ~captured
+        bitboards = self.bitboards
+        queens = bitboards[enemy_color + 'Q']
+        return not (KNIGHT_ATTACKS[king_sq] & bitboards[enemy_color + 'N'] & enemies or
+                    PAWN_ATTACKS[ally_color][king_sq] & bitboards[enemy_color + 'p'] & enemies or
+                    KING_ATTACKS[king_sq] & bitboards[enemy_color + 'K'] or
+                    rook_attacks(king_sq, occupied) & (bitboards[enemy_color + 'R'] | queens) & enemies or
+                    bishop_attacks(king_sq, occupied) & (bitboards[enemy_color + 'B'] | queens) & enemies)
+
+    def attack_map(self, color):
+        """
+        bitboard of every square attacked by color's pieces. The other king is left out of the occupancy so a square
+        behind it on a checking ray still counts as attacked, the king can't step back along the ray
+        """
+        enemy_color = 'b' if color == 'w' else 'w'
+        bitboards = self.bitboards
+        occupied = self.occupied & ~bitboards[enemy_color + 'K']
+        attacks = (pawn_attacks(bitboards[color + 'p'], color) | knight_attacks(bitboards[color + 'N']) |
+                   king_attacks(bitboards[color + 'K']))
+        queens = bitboards[color + 'Q']
+        for sq in iter_bits(bitboards[color + 'R'] | queens):
+            attacks |= rook_attacks(sq, occupied)
+        for sq in iter_bits(bitboards[color + 'B'] | queens):
+            attacks |= bishop_attacks(sq, occupied)
+        return attacks
 
     def get_valid_moves(self):
         """
         all moves considering checks
         """
-        temp_castle_rights = castle_rights(self.current_castle_right.wks, self.current_castle_right.wqs,
-                                           self.current_castle_right.bks, self.current_castle_right.bqs)
         moves = []
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        # one attack map serves all of the king moves and the castling checks below
+        self.attacked = self.attack_map('b' if self.white2move else 'w')
         if self.white2move:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
@@ -173,30 +433,21 @@ class Gamestate():
             kingCol = self.blackKingLocation[1]
 
         if self.inCheck:
-            print("check!")
+            if self.trace:
+                self.trace("check!")
             if len(self.checks) == 1:  # only check by 1 piece
                 moves = self.possible_moves()
                 check = self.checks[0]
                 checkRow = check[0]
                 checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]  # identify the enemy piece that is checking your king
-                validSquares = []  # sqaures that pieces can move to , if knight must capture knight or move king, else see if can be block by other pieces
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (
-                        kingRow + check[2] * i, kingCol + check[3] * i)  # check[2] and check[3] are the check direction
-                        validSquares.append(validSquare)
-                        print(validSquare, checkRow, checkCol)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
-                for i in range(len(moves) - 1, -1,
-                               -1):  # go through backwards when you are removing from a list as iterating
-                    if moves[i].pieceMoved[1] != 'K':  # move doesn't move king so it must be block or capture
-                        if not (moves[i].endRow,
-                                moves[i].endCol) in validSquares:  # move doesnt block check or capture piece
-                            moves.remove(moves[i])
+                # squares that pieces can move to: capture the checking piece, or block it if it is a slider
+                validSquares = 1 << (checkRow * 8 + checkCol) | BETWEEN[kingRow * 8 + kingCol][checkRow * 8 + checkCol]
+                # a pawn that gave check with a double push can also be taken enpassant
+                enpassantEvasion = self.enpassant_possible and self.board[checkRow][checkCol][1] == 'p'
+                # king moves are already safe, any other move has to block the check or capture the piece
+                moves = [move for move in moves if move.pieceMoved[1] == 'K' or
+                         validSquares >> (move.moveId >> 6 & 63) & 1 or
+                         enpassantEvasion and move.flags & ENPASSANT_FLAG]
             else:  # double check so king has to move
                 self.get_king_moves(kingRow, kingCol, moves)
         else:  # not in check
@@ -208,23 +459,123 @@ class Gamestate():
         if len(moves) == 0:
             if self.inCheck:
                 self.check_mate = True
-                print('Check Mate !')
+                if self.trace:
+                    self.trace('Check Mate !')
             else:
                 self.stale_mate = True
-        self.current_castle_right = temp_castle_rights
+        else:  # a search may have visited a mate or stalemate, clear it again once moves exist
+            self.check_mate = False
+            self.stale_mate = False
         return moves
 
+    def pseudo_legal_moves(self):
+        """
+        all moves including castling, without checking whether they leave the king in check. Pins and king safety
+        are left for the search to test with is_legal, only for the moves it actually plays
+        """
+        self.pins = []
+        self.attacked = 0
+        moves = self.possible_moves()
+        rights = self.current_castle_right
+        if self.white2move and (rights.wks or rights.wqs) or not self.white2move and (rights.bks or rights.bqs):
+            # castling is the one move whose legality depends on squares the king only passes through
+            kingRow, kingCol = self.whiteKingLocation if self.white2move else self.blackKingLocation
+            king_sq = kingRow * 8 + kingCol
+            enemy_color = 'b' if self.white2move else 'w'
+            self.inCheck = self.square_attacked(king_sq, enemy_color)
+            if not self.inCheck:
+                # only the empty squares beside the king matter, a full attack map would be wasted
+                for sq in (king_sq - 2, king_sq - 1, king_sq + 1, king_sq + 2):
+                    if not self.occupied >> sq & 1 and self.square_attacked(sq, enemy_color):
+                        self.attacked |= 1 << sq
+                self.get_castle_move(kingRow, kingCol, moves)
+        return moves
+
+    def capture_moves(self):
+        """
+        pseudo legal captures (enpassant included) and promotions, for the quiescence search. The targets are the
+        attack bitboards masked with the enemy pieces, so no quiet move is ever generated. A promotion without a
+        capture is only made to a queen
+        """
+        if self.white2move:
+            color, enemy_color, forward, promotion_row = 'w', 'b', -8, 1
+        else:
+            color, enemy_color, forward, promotion_row = 'b', 'w', 8, 6
+        bitboards = self.bitboards
+        board = self.board
+        enemies = self.color_occupancy[enemy_color]
+        moves = []
+        piece = color + 'p'
+        enpassant = 1 << (self.enpassant_possible[0] * 8 + self.enpassant_possible[1]) if self.enpassant_possible else 0
+        for sq in iter_bits(bitboards[piece]):
+            promotion = sq >> 3 == promotion_row
+            for end_sq in iter_bits(PAWN_ATTACKS[color][sq] & (enemies | enpassant)):
+                if 1 << end_sq == enpassant:
+                    moves.append(Move.from_squares(sq, end_sq, piece, enemy_color + 'p', ENPASSANT_FLAG))
+                elif promotion:
+                    self.add_promotions(sq, end_sq, piece, board[end_sq >> 3][end_sq & 7], moves)
+                else:
+                    moves.append(Move.from_squares(sq, end_sq, piece, board[end_sq >> 3][end_sq & 7]))
+            if promotion and not self.occupied >> (sq + forward) & 1:
+                moves.append(Move.from_squares(sq, sq + forward | 4 << 6, piece, '--', PROMOTION_FLAG))
+        for sq in iter_bits(bitboards[color + 'N']):
+            self.add_moves(sq, KNIGHT_ATTACKS[sq] & enemies, moves)
+        queens = bitboards[color + 'Q']
+        for sq in iter_bits(bitboards[color + 'B'] | queens):
+            self.add_moves(sq, bishop_attacks(sq, self.occupied) & enemies, moves)
+        for sq in iter_bits(bitboards[color + 'R'] | queens):
+            self.add_moves(sq, rook_attacks(sq, self.occupied) & enemies, moves)
+        for sq in iter_bits(bitboards[color + 'K']):
+            self.add_moves(sq, KING_ATTACKS[sq] & enemies, moves)
+        return moves
+
+    def parse_move(self, notation):
+        """the legal move written in long algebraic notation (e2e4, e7e8q), or None if there isn't one"""
+        for move in self.get_valid_moves():
+            if move.get_chess_notation() == notation:
+                return move
+        return None
+
+    def parse_san(self, san):
+        """
+        the legal move written in standard algebraic notation (e4, Nbd7, exd5, O-O, e8=Q+), or None if there isn't one
+        """
+        san = san.rstrip('+#!?')
+        if san in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+            queen_side = len(san) == 5
+            for move in self.get_valid_moves():
+                if move.flags & CASTLE_FLAG and ((move.moveId >> 6 & 7) == 2) == queen_side:
+                    return move
+            return None
+        promotion = ''
+        if '=' in san:
+            san, promotion = san.split('=', 1)
+        elif san[-1:] in ('N', 'B', 'R', 'Q') and san[:1].islower():  # promotion written without the =, e8Q
+            san, promotion = san[:-1], san[-1]
+        piece = san[0] if san[:1] in ('N', 'B', 'R', 'Q', 'K') else 'p'
+        squares = san[1:] if piece != 'p' else san
+        squares = squares.replace('x', '').replace('-', '')
+        target, hint = squares[-2:], squares[:-2]  # hint is the file and/or rank that tells two movers apart
+        if len(target) != 2 or target[0] not in Move.files2Cols or target[1] not in Move.ranks2Rows:
+            return None
+        end = Move.ranks2Rows[target[1]] * 8 + Move.files2Cols[target[0]]
+        for move in self.get_valid_moves():
+            if move.pieceMoved[1] != piece or move.moveId >> 6 & 63 != end or move.promotion != promotion:
+                continue
+            start = move.get_rank_file(move.startRow, move.startCol)
+            if all(h in start for h in hint):
+                return move
+        return None
+
     def possible_moves(self):
         """
         all moves without considering checks
         """
         moves = []
-        for r in range(len(self.board)):  # number of rows
-            for c in range(len(self.board[r])):  # number of columns in a given row
-                turn = self.board[r][c][0]  # color
-                if (turn == 'w' and self.white2move) or (turn == 'b' and not self.white2move):
-                    piece = self.board[r][c][1]  # piece type
-                    self.moveFunctions[piece](r, c, moves)  # call the appropriate move function based on piece
+        color = 'w' if self.white2move else 'b'
+        for piece in ('p', 'N', 'B', 'R', 'Q', 'K'):
+            for sq in iter_bits(self.bitboards[color + piece]):  # only visit the squares holding this piece
+                self.moveFunctions[piece](sq >> 3, sq & 7, moves)  # call the appropriate move function based on piece
         return moves
 
     def checkForPinsAndChecks(self):
@@ -241,276 +592,255 @@ class Gamestate():
             ally_color = "b"
             start_row = self.blackKingLocation[0]
             start_col = self.blackKingLocation[1]
-        # check outwards from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            direction = directions[j]
-            possible_pin = ()  # reset possible pins
-            for i in range(1, 8):
-                end_row = start_row + direction[0] * i
-                end_col = start_col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():  # first allied piece could be pinned
-                            possible_pin = (end_row, end_col, direction[0], direction[1])
-                        else:  # 2nd allied piece - no check or pin from this direction
-                            break
-                    elif end_piece[0] == enemy_color:
-                        enemy_type = end_piece[1]
-                        # 5 possibilities in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and enemy_type == "R") or (4 <= j <= 7 and enemy_type == "B") or (
-                                i == 1 and enemy_type == "p" and (
-                                (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or (
-                                enemy_type == "Q") or (i == 1 and enemy_type == "K"):
-                            if possible_pin == ():  # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row, end_col, direction[0], direction[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possible_pin)
-                                break
-                        else:  # enemy piece not applying checks
-                            break
-                else:
-                    break  # off board
-        # check for knight checks
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N":  # enemy knight attacking a king
+        king_sq = start_row * 8 + start_col
+        # the king itself never blocks a ray, it may be standing in for a king move being tested
+        occupied = self.occupied & ~self.bitboards[ally_color + "K"]
+        enemies = self.color_occupancy[enemy_color]
+        # check outwards from king along each ray for pins and checks, keep track of pins
+        for direction in QUEEN_DIRECTIONS:
+            end_sq = first_blocker(king_sq, occupied, direction)
+            if end_sq == -1:
+                continue
+            sliders = SLIDERS[direction]
+            end_piece = self.board[end_sq >> 3][end_sq & 7]
+            if end_piece[0] == enemy_color:
+                if end_piece[1] in sliders:
                     in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+                    checks.append((end_sq >> 3, end_sq & 7, direction[0], direction[1]))
+            else:  # first allied piece could be pinned if an enemy slider is right behind it
+                pinner = first_blocker(end_sq, occupied, direction)
+                if pinner != -1 and enemies >> pinner & 1 and self.board[pinner >> 3][pinner & 7][1] in sliders:
+                    pins.append((end_sq >> 3, end_sq & 7, direction[0], direction[1]))
+        # check for knight, pawn and king checks with reverse lookups from the king square
+        attackers = (KNIGHT_ATTACKS[king_sq] & self.bitboards[enemy_color + "N"] |
+                     PAWN_ATTACKS[ally_color][king_sq] & self.bitboards[enemy_color + "p"] |
+                     KING_ATTACKS[king_sq] & self.bitboards[enemy_color + "K"])
+        for end_sq in iter_bits(attackers):
+            end_row, end_col = end_sq >> 3, end_sq & 7
+            in_check = True
+            checks.append((end_row, end_col, end_row - start_row, end_col - start_col))
         return in_check, pins, checks
 
-    def get_pawn_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
+    def get_pin_mask(self, r, c, remove_pin=True):
+        """
+        squares a piece on (r, c) may move to without exposing its king, every square if it isn't pinned
+        """
         for i in range(len(self.pins) - 1, -1, -1):
             if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+                if remove_pin:
+                    self.pins.remove(self.pins[i])
+                kingRow, kingCol = self.whiteKingLocation if self.white2move else self.blackKingLocation
+                return LINE[kingRow * 8 + kingCol][r * 8 + c]
+        return FULL
 
+    def get_pawn_moves(self, r, c, moves):
+        pinMask = self.get_pin_mask(r, c)
         if self.white2move:
-            if self.board[r - 1][c] == "--":  # 1 square pawn advance
-                if not piecePinned or pinDirection == (-1, 0):
-                    moves.append(Move((r, c), (r - 1, c), self.board))
-                    if r == 6 and self.board[r - 2][c] == "--":  # 2 square pawn advance
-                        moves.append(Move((r, c), (r - 2, c), self.board))
-            # capture
-            if c - 1 >= 0:  # capture to the left
-                if self.board[r - 1][c - 1][0] == 'b':
-                    if not piecePinned or pinDirection == (-1, -1):
-                        moves.append(Move((r, c), (r - 1, c - 1), self.board))
-                elif (r - 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board, is_enpassant_move=True))
-
-            if c + 1 <= 7:  # capture to the right
-                if self.board[r - 1][c + 1][0] == 'b':
-                    if not piecePinned or pinDirection == (-1, 1):
-                        moves.append(Move((r, c), (r - 1, c + 1), self.board))
-                elif (r - 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, is_enpassant_move=True))
+            color, enemyColor, moveAmount, startRow = 'w', 'b', -1, 6
         else:
-            if self.board[r + 1][c] == "--":
-                if not piecePinned or pinDirection == (1, 0):
-                    moves.append(Move((r, c), (r + 1, c), self.board))
-                    if r == 1 and self.board[r + 2][c] == "--":
-                        moves.append(Move((r, c), (r + 2, c), self.board))
-
-            if c - 1 >= 0:  # capture to the left
-                if self.board[r + 1][c - 1][0] == 'w':
-                    if not piecePinned or pinDirection == (1, -1):
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r + 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, is_enpassant_move=True))
-            if c + 1 <= 7:  # capture to the right
-                if self.board[r + 1][c + 1][0] == 'w':
-                    if not piecePinned or pinDirection == (1, 1):
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r + 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, is_enpassant_move=True))
+            color, enemyColor, moveAmount, startRow = 'b', 'w', 1, 1
+        sq = r * 8 + c
+        piece = color + 'p'
+        forward = sq + 8 * moveAmount
+        promotion = r + moveAmount in (0, 7)
+        if not self.occupied >> forward & 1:  # 1 square pawn advance
+            if pinMask >> forward & 1:
+                if promotion:
+                    self.add_promotions(sq, forward, piece, '--', moves)
+                else:
+                    moves.append(Move.from_squares(sq, forward, piece, '--'))
+                if r == startRow and not self.occupied >> (forward + 8 * moveAmount) & 1:  # 2 square pawn advance
+                    moves.append(Move.from_squares(sq, forward + 8 * moveAmount, piece, '--'))
+        # captures, including onto the enpassant square
+        enpassant = 1 << (self.enpassant_possible[0] * 8 + self.enpassant_possible[1]) if self.enpassant_possible else 0
+        targets = PAWN_ATTACKS[color][sq] & (self.color_occupancy[enemyColor] | enpassant) & pinMask
+        for end_sq in iter_bits(targets):
+            if 1 << end_sq == enpassant:
+                if self.enpassant_exposes_king(sq, end_sq):
+                    continue
+                moves.append(Move.from_squares(sq, end_sq, piece, enemyColor + 'p', ENPASSANT_FLAG))
+            elif promotion:
+                self.add_promotions(sq, end_sq, piece, self.board[end_sq >> 3][end_sq & 7], moves)
+            else:
+                moves.append(Move.from_squares(sq, end_sq, piece, self.board[end_sq >> 3][end_sq & 7]))
+
+    def enpassant_exposes_king(self, sq, end_sq):
+        """
+        an enpassant capture takes two pawns off the same rank, which can uncover a rook or queen on the king there
+        """
+        kingRow, kingCol = self.whiteKingLocation if self.white2move else self.blackKingLocation
+        if kingRow != sq >> 3:
+            return False
+        enemyColor = 'b' if self.white2move else 'w'
+        captured_sq = (sq & ~7) | (end_sq & 7)
+        occupied = self.occupied & ~(1 << sq | 1 << captured_sq) | 1 << end_sq
+        attackers = self.bitboards[enemyColor + 'R'] | self.bitboards[enemyColor + 'Q']
+        return bool(rook_attacks(kingRow * 8 + kingCol, occupied) & attackers)
+
+    def add_promotions(self, sq, end_sq, piece, captured, moves):
+        """one move for each piece the pawn can promote to, queen first"""
+        for promotion in (4, 1, 3, 2):  # Q, N, R, B
+            moves.append(Move.from_squares(sq, end_sq | promotion << 6, piece, captured, PROMOTION_FLAG))
 
     def get_rook_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][
-                    1] != 'Q':  # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        enemyColor = "b" if self.white2move else "w"
-        for d in directions:
-            for i in range(1, 8):  # rooks can move up to 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endCol < 8 and 0 <= endRow < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                    else:  # out of the board
-                        break
+        # can't remove queen from pin on rook moves, only remove it on bishop moves
+        pinMask = self.get_pin_mask(r, c, remove_pin=self.board[r][c][1] != 'Q')
+        self.add_moves(r * 8 + c, rook_attacks(r * 8 + c, self.occupied) & pinMask, moves)
+
+    def add_moves(self, sq, targets, moves):
+        """
+        add a move from sq to every square in the targets bitboard that isn't held by the mover's own side
+        """
+        board = self.board
+        piece = board[sq >> 3][sq & 7]
+        for end_sq in iter_bits(targets & ~self.color_occupancy[piece[0]]):
+            moves.append(Move.from_squares(sq, end_sq, piece, board[end_sq >> 3][end_sq & 7]))
 
     def get_knight_moves(self, r, c, moves):
-        piecePinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (1, -2), (1, 2), (2, 1), (-1, 2), (2, -1))
-        allyColor = "w" if self.white2move else "b"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+        if self.get_pin_mask(r, c) != FULL:  # a pinned knight can never move
+            return
+        self.add_moves(r * 8 + c, KNIGHT_ATTACKS[r * 8 + c], moves)
 
     def get_bishop_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # bl, br,tl,tr
-        enemyColor = "b" if self.white2move else "w"
-        for d in directions:
-            for i in range(1, 8):  # rooks can move up to 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endCol < 8 and 0 <= endRow < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:  # out of the board
-                    break
+        pinMask = self.get_pin_mask(r, c)
+        self.add_moves(r * 8 + c, bishop_attacks(r * 8 + c, self.occupied) & pinMask, moves)
 
     def get_queen_moves(self, r, c, moves):
         self.get_rook_moves(r, c, moves)
         self.get_bishop_moves(r, c, moves)
 
     def get_king_moves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        allyColor = "w" if self.white2move else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+        sq = r * 8 + c
+        self.add_moves(sq, KING_ATTACKS[sq] & ~self.attacked, moves)
 
     def get_castle_move(self, r, c, moves):
         '''
         generate all valid castle moves for the king at (r, c) and add them to the list of moves
         '''
-        in_checks, pins, check = self.checkForPinsAndChecks()
-        if in_checks:
+        if self.inCheck:
             return
 
         if (self.white2move and self.current_castle_right.wks) or (
                 not self.white2move and self.current_castle_right.bks):
             self.get_king_side_castle_move(r, c, moves)
-        if (self.white2move and self.current_castle_right.bqs) or (
-                not self.white2move and self.current_castle_right.wqs):
+        if (self.white2move and self.current_castle_right.wqs) or (
+                not self.white2move and self.current_castle_right.bqs):
             self.get_queen_side_castle_move(r, c, moves)
 
     def get_king_side_castle_move(self, r, c, moves):
 
         if self.board[r][c + 1] == '--' and self.board[r][c + 2] == "--":
-            print("1")
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
-                print('2')
-                moves.append(Move((r, c), (r, c + 2), self.board, is_castle_move=True))
+            if not self.attacked >> (r * 8 + c + 1) & 3:  # neither square the king crosses is attacked
+                if self.trace:
+                    self.trace("king side castle possible")
+                moves.append(Move.from_squares(r * 8 + c, r * 8 + c + 2, self.board[r][c], '--', CASTLE_FLAG))
 
     def get_queen_side_castle_move(self, r, c, moves):
         if self.board[r][c - 1] == '--' and self.board[r][c - 2] == "--" and self.board[r][c - 3] == '--':
-            print('10')
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
-                print('11')
-                moves.append(Move((r, c), (r, c - 2), self.board, is_castle_move=True))
+            if not self.attacked >> (r * 8 + c - 2) & 3:
+                if self.trace:
+                    self.trace("queen side castle possible")
+                moves.append(Move.from_squares(r * 8 + c, r * 8 + c - 2, self.board[r][c], '--', CASTLE_FLAG))
+
+
+def castle_right_bit(bit):
+    """property reading and setting one right of a castle_rights"""
+    def get(self):
+        return bool(self.bits & bit)
+
+    def set(self, held):
+        self.bits = self.bits | bit if held else self.bits & ~bit
+    return property(get, set)
 
 
 class castle_rights():
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+    """the four castling rights as the bits WKS, WQS, BKS and BQS of one int, which is all a move has to save"""
+    __slots__ = ('bits',)
+    wks = castle_right_bit(WKS)
+    wqs = castle_right_bit(WQS)
+    bks = castle_right_bit(BKS)
+    bqs = castle_right_bit(BQS)
+
+    def __init__(self, wks, wqs, bks, bqs):
+        self.bits = (WKS if wks else 0) | (WQS if wqs else 0) | (BKS if bks else 0) | (BQS if bqs else 0)
 
 
 class Move():
+    """
+    A move kept in four slots: moveId packs the start square in bits 0-5, the end square in bits 6-11 (square is
+    row * 8 + col) and the promotion piece in bits 12-14, flags marks enpassant, castle and promotion moves. Rows and
+    columns are decoded only when asked for
+    """
+    __slots__ = ('moveId', 'flags', 'pieceMoved', 'pieceCaptured')
     ranks2Rows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     rows2ranks = {v: k for k, v in ranks2Rows.items()}
     files2Cols = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
     cols2files = {v: k for k, v in files2Cols.items()}
 
-    def __init__(self, startSq, endSq, board, is_enpassant_move=False, is_castle_move=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveId = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+    def __init__(self, startSq, endSq, board, is_enpassant_move=False, is_castle_move=False, promotion='Q'):
+        self.moveId = startSq[0] * 8 + startSq[1] | (endSq[0] * 8 + endSq[1]) << 6
+        self.pieceMoved = board[startSq[0]][startSq[1]]
+        self.pieceCaptured = board[endSq[0]][endSq[1]]
+        self.flags = 0
 
         # pawn promotion
-        self.is_pawn_promotion = False
-        if (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7):
-            self.is_pawn_promotion = True
+        if (self.pieceMoved == 'wp' and endSq[0] == 0) or (self.pieceMoved == 'bp' and endSq[0] == 7):
+            self.flags |= PROMOTION_FLAG
+            self.moveId |= PROMOTION_PIECES.index(promotion) << 12
 
         # En passant
-        self.is_enpassant_move = is_enpassant_move
-        if self.is_enpassant_move:
+        if is_enpassant_move:
+            self.flags |= ENPASSANT_FLAG
             self.pieceCaptured = "wp" if self.pieceMoved == 'bp' else 'bp'
 
         # castle move
-        self.is_castle_move = is_castle_move
+        if is_castle_move:
+            self.flags |= CASTLE_FLAG
+
+    @classmethod
+    def from_squares(cls, start, end, pieceMoved, pieceCaptured, flags=0):
+        """
+        build a move straight from square indexes and the pieces involved, used by the move generators
+        """
+        move = cls.__new__(cls)
+        move.moveId = start | end << 6
+        move.flags = flags
+        move.pieceMoved = pieceMoved
+        move.pieceCaptured = pieceCaptured
+        return move
+
+    @property
+    def startRow(self):
+        return (self.moveId & 63) >> 3
+
+    @property
+    def startCol(self):
+        return self.moveId & 7
+
+    @property
+    def endRow(self):
+        return self.moveId >> 9 & 7
+
+    @property
+    def endCol(self):
+        return self.moveId >> 6 & 7
+
+    @property
+    def promotion(self):
+        """the piece type promoted to, '' if the move isn't a promotion"""
+        return PROMOTION_PIECES[self.moveId >> 12]
+
+    @property
+    def is_pawn_promotion(self):
+        return bool(self.flags & PROMOTION_FLAG)
+
+    @property
+    def is_enpassant_move(self):
+        return bool(self.flags & ENPASSANT_FLAG)
+
+    @property
+    def is_castle_move(self):
+        return bool(self.flags & CASTLE_FLAG)
 
     def __eq__(self, other):
         """
@@ -520,8 +850,12 @@ class Move():
             return self.moveId == other.moveId
         return False
 
+    def __hash__(self):
+        return self.moveId
+
     def get_chess_notation(self):
-        return self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol)
+        return self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol) + \
+               self.promotion.lower()
 
     def get_rank_file(self, r, c):
         return self.cols2files[c] + self.rows2ranks[r]
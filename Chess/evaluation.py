@@ -0,0 +1,130 @@
+"""
+Static evaluation: material plus piece-square tables, with separate middlegame and endgame values blended by the game
+phase (how much non pawn material is left). Every term is a value per (piece, square), so the Gamestate keeps the
+running middlegame and endgame sums and the phase up to date in set_square, and evaluating a position is O(1).
+
+Scores are in centipawns from white's point of view. The tables are the "simplified evaluation function" ones, written
+from white's side with a8 first (the same order as the square index row * 8 + col); black uses the mirrored square.
+"""
+
+MG_PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+EG_PIECE_VALUES = {'p': 120, 'N': 300, 'B': 320, 'R': 530, 'Q': 940, 'K': 0}
+PHASE_WEIGHTS = {'p': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24  # all the minor pieces, rooks and queens still on the board
+
+PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0)
+PAWN_ENDGAME_TABLE = (  # the further a pawn has come the closer it is to promoting, once the pieces are off
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20)
+KING_TABLE = (  # tucked away behind its pawns while there are pieces to attack it
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+KING_ENDGAME_TABLE = (  # in the centre once it is safe to come out
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+MG_TABLES = {'p': PAWN_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE,
+             'K': KING_TABLE}
+EG_TABLES = {'p': PAWN_ENDGAME_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE,
+             'K': KING_ENDGAME_TABLE}
+
+
+def piece_square_values(values, tables):
+    """
+    value of each piece on each square for white, negative for black pieces, indexed [piece string][square].
+    The empty square '--' is all zeros so set_square can look it up like any piece
+    """
+    result = {'--': (0,) * 64}
+    for piece_type, table in tables.items():
+        result['w' + piece_type] = tuple(values[piece_type] + table[sq] for sq in range(64))
+        result['b' + piece_type] = tuple(-(values[piece_type] + table[sq ^ 56]) for sq in range(64))  # mirrored
+    return result
+
+
+MG_VALUES = piece_square_values(MG_PIECE_VALUES, MG_TABLES)
+EG_VALUES = piece_square_values(EG_PIECE_VALUES, EG_TABLES)
+PHASE = {'--': 0}
+PHASE.update({color + piece_type: weight for piece_type, weight in PHASE_WEIGHTS.items() for color in 'wb'})
+
+
+def evaluate(gs, extra_mg=0, extra_eg=0):
+    """
+    score of the position in centipawns, from white's point of view. extra_mg and extra_eg are further terms (pawn
+    structure) tapered along with the piece-square score
+    """
+    phase = min(gs.phase, MAX_PHASE)
+    return ((gs.mg_score + extra_mg) * phase + (gs.eg_score + extra_eg) * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def evaluate_from_scratch(board):
+    """(middlegame score, endgame score, phase) summed over the whole board, to initialise a Gamestate"""
+    mg = eg = phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            mg += MG_VALUES[piece][r * 8 + c]
+            eg += EG_VALUES[piece][r * 8 + c]
+            phase += PHASE[piece]
+    return mg, eg, phase
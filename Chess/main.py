@@ -2,15 +2,26 @@
 Main file use for handling user input and displayimng the current GameState object
 """
 
+import copy
+import threading
+
 import pygame as p
 from Chess import chessEngine
-#from Chess import SmartMoves as sm
+from Chess import SmartMoves as sm
 
 width = height = 512
 Dimension = 8
 square_size = width // Dimension
 max_fps = 15
+player_one = True  # True if a human plays white, False for the AI
+player_two = False  # True if a human plays black, False for the AI
+book_file = None  # Polyglot opening book (.bin) for the AI player, e.g. one built with python -m Chess.book build
+ai_time_ms = 1000  # thinking time per move for the AI player
 images = {}
+highlights = {} # translucent squares for the selected piece ('selected') and where it can go ('target')
+fonts = {}
+board_surface = None # the empty board, drawn once by load_board
+on_screen = [None] * 64 # (piece, highlight) shown on each square, a frame only redraws the squares that change
 
 '''
 Initialize a global dictionary of images. Call exactly once in the main
@@ -21,6 +32,61 @@ def load_images():
         images[piece] = p.transform.scale(p.image.load("Chess/images/" + piece + ".png"), (square_size, square_size))
         # we can access an image by calling images['wp']
 
+def load_board():
+    '''
+    draw the empty board to a surface once, frames copy squares from it instead of drawing them. Also makes the
+    highlight squares
+    '''
+    global board_surface, colors
+    colors = [p.Color('white'), p.Color('gray')]
+    board_surface = p.Surface((width, height))
+    drawBoard(board_surface)
+    for highlight, color in (('selected', 'blue'), ('target', 'yellow')):
+        s = p.Surface((square_size, square_size))
+        s.set_alpha(100)  # transparency value -> 0 transparent, 255 opaque
+        s.fill(p.Color(color))
+        highlights[highlight] = s
+    on_screen[:] = [None] * 64
+
+class BackgroundSearch():
+    '''
+    the AI's search, run on a worker thread on its own copy of the game so the event loop keeps drawing and handling
+    input however long it thinks. The loop polls done() once a frame
+    '''
+    def __init__(self, gs, time_ms):
+        self.gs = copy.deepcopy(gs)
+        self.best_move = None
+        self.info = None  # (depth, score, pv) of the deepest iteration finished so far
+        self.thread = threading.Thread(target=self.think, args=(time_ms,), daemon=True)
+        self.thread.start()
+
+    def think(self, time_ms):
+        sm.default_search.on_iteration = self.report
+        try:
+            self.best_move, pv = sm.find_best_move(self.gs, self.gs.get_valid_moves(), time_ms=time_ms)
+        finally:
+            sm.default_search.on_iteration = None
+
+    def report(self, depth, score, nodes, pv):
+        self.info = depth, score, pv
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        '''stop the search and wait for the thread to finish, its move is thrown away'''
+        while self.thread.is_alive():  # repeated, the stop could land before the search has started
+            sm.default_search.stop()
+            self.thread.join(0.01)
+
+    def status(self):
+        '''depth, score and best line so far, for the window caption'''
+        if self.info is None:
+            return "thinking"
+        depth, score, pv = self.info
+        return f"depth {depth} {sm.format_score(score)} " + " ".join(move.get_chess_notation() for move in pv)
+
+
 '''
 main driver for our code. This will handle user input and updating the graphics
 '''
@@ -35,20 +101,30 @@ def main():
     move_made = False # flag variable for when a move is made
     animate = False
     load_images()
+    load_board()
+    if book_file:
+        sm.set_opening_book(book_file)
     running = True
     sq_selected = () # no square is selected initially, keep tract of the last click of the user 'tuple: (row, col)'
     player_clicks = [] # keep tract of player clicks (two tuples: [(6,4),(4,4)]
     gameOver = False
-    #player1 = True # if human player is playing white this will be True. If AI is playing then false
-    #player2 = False # if human player is playing black this will be True. If AI is playing then false
+    promotion_piece = 'Q' # piece a pawn promotes to, press p to cycle through Q, N, R, B
+    caption = "Chess - promote to " + promotion_piece
+    p.display.set_caption(caption)
+    ai = None # the BackgroundSearch while the AI is thinking
+    move_undone = False # after a takeback the AI waits for the human to move instead of playing again at once
+    text_shown = None # the game over message on the board
+    exposed = False # the whole window is put on the display on the next frame
     while running:
-        #human_turn = (gs.white2move and player1) or (not gs.white2move and player2)
+        human_turn = (gs.white2move and player_one) or (not gs.white2move and player_two)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+            elif e.type in (p.VIDEOEXPOSE, p.WINDOWEXPOSED): # shown again, screen still holds the whole frame
+                exposed = True
             # mouse event handles
             elif e.type == p.MOUSEBUTTONDOWN:
-                if not gameOver:
+                if not gameOver and human_turn:
                     location = p.mouse.get_pos() #(x,y) location of mouse
                     col = location[0]//square_size
                     row = location[1]//square_size
@@ -59,89 +135,150 @@ def main():
                         sq_selected = (row, col)
                         player_clicks.append(sq_selected) # append both first and second clicks
                     if len(player_clicks) == 2: # after 2nd click
-                        move = chessEngine.Move(player_clicks[0], player_clicks[1], gs.board)
+                        move = chessEngine.Move(player_clicks[0], player_clicks[1], gs.board, promotion=promotion_piece)
                         print(move.get_chess_notation())
                         for i in range(len(validMoves)):
                             if move ==  validMoves[i]:
                                 gs.make_move(validMoves[i])
                                 move_made = True
                                 animate = True
+                                move_undone = False
                                 sq_selected = () # reset user clicks
                                 player_clicks = []
                             if not move_made:
                                 player_clicks = [sq_selected]
             # key handlers
             elif e.type == p.KEYDOWN:
-                if e.key == p.K_z: # undo when z is pressed
+                if e.key == p.K_z: # undo when z is pressed, the AI's search is abandoned if it is thinking
+                    if ai is not None:
+                        ai.cancel()
+                        ai = None
                     gs.undo_move()
                     animate = False
                     move_made = True
+                    move_undone = True
+                    gameOver = False
+
+                if e.key == p.K_p: # choose the promotion piece
+                    promotion_piece = 'QNRB'[('QNRB'.index(promotion_piece) + 1) % 4]
+                    caption = None # set again below
+
+                if e.key == p.K_c: # cancel the AI's search, pressing c again lets it move
+                    if ai is not None:
+                        ai.cancel()
+                        ai = None
+                        move_undone = True
+                    else:
+                        move_undone = False
 
                 if e.key == p.K_r: # reset the board if 'r' is pressed
+                    if ai is not None:
+                        ai.cancel()
+                        ai = None
+                    move_undone = False
+                    gameOver = False
                     gs = chessEngine.Gamestate()
                     validMoves = gs.get_valid_moves()
                     sq_selected = ()
                     player_clicks = []
                     move_made = False
                     animate = False
-        # if not gameOver and not human_turn:
-        #     ai_move = sm.find_best_move(gs, validMoves)
-        #     gs.make_move(ai_move)
-        #     move_made = True
-            animate = True
+        # the AI searches in the background, its move is played on the first frame after it is done
+        human_turn = (gs.white2move and player_one) or (not gs.white2move and player_two)
+        if not gameOver and not human_turn and not move_undone and not move_made:
+            if ai is None:
+                ai = BackgroundSearch(gs, ai_time_ms)
+            elif ai.done():
+                for move in validMoves:
+                    if move == ai.best_move:
+                        gs.make_move(move)
+                        move_made = True
+                        animate = True
+                ai = None
+        new_caption = "Chess - promote to " + promotion_piece + (" - " + ai.status() if ai is not None else "")
+        if new_caption != caption:
+            caption = new_caption
+            p.display.set_caption(caption)
 
         if move_made:
-            animateMove(gs.movelog[-1], screen,gs.board,clock)
+            if animate:
+                animateMove(gs.movelog[-1], screen,gs.board,clock)
             validMoves = gs.get_valid_moves()
             move_made = False
             animate = False
-        drawGameState(screen, gs, validMoves, sq_selected)
+        dirty = drawGameState(screen, gs, validMoves, sq_selected)
+        text = None
         if gs.check_mate:
             gameOver = True
             if gs.white2move:
-                drawText(screen, 'Black wins by Checkmate')
+                text = 'Black wins by Checkmate'
             else:
-                drawText(screen, 'White wins by Checkmate')
+                text = 'White wins by Checkmate'
         elif gs.stale_mate:
             gameOver = True
-            drawText(screen, 'stalemate')
+            text = 'stalemate'
+        elif gs.is_draw():
+            gameOver = True
+            text = 'draw by fifty move rule' if gs.halfmove_clock >= 100 else 'draw by repetition'
+        if text != text_shown and text_shown is not None: # the message goes, redraw the squares it covered
+            on_screen[:] = [None] * 64
+            dirty = drawGameState(screen, gs, validMoves, sq_selected)
+        if text is not None and (text != text_shown or dirty): # squares under it may have been drawn over it
+            dirty.append(drawText(screen, text))
+        text_shown = text
         clock.tick(max_fps)
-        p.display.flip()
+        if exposed:
+            p.display.flip()
+            exposed = False
+        else:
+            p.display.update(dirty) # only what changed this frame
 
-def highlight_squares(screen, gs, validMoves, sq_selected):
+def highlight_squares(gs, validMoves, sq_selected):
     '''
-    highligh move sleected and piece selected
+    {(row, col): highlight} for the selected piece and the squares it can move to
     '''
+    marked = {}
     if sq_selected != ():
         r, c = sq_selected
         if gs.board[r][c][0] == ('w' if gs.white2move else 'b'):  # sqSelected is a piece that can be moved
-            s = p.Surface((square_size, square_size))
-            s.set_alpha(100)  # transparency value -> 0 transparent, 255 opaque
-            s.fill(p.Color('blue'))
-            screen.blit(s, (c * square_size, r * square_size))
-
-            # Place dots on squares of valid moves from the selected square
-            s.fill(p.Color('yellow'))
+            marked[(r, c)] = 'selected'
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (square_size*move.endCol, square_size*move.endRow))
-
+                    marked[(move.endRow, move.endCol)] = 'target'
+    return marked
 
 
 def drawGameState(screen, gs, validMoves, sq_selected):
     '''
-    responsible for all graphics within a current game state
+    responsible for all graphics within a current game state. Only the squares whose piece or highlight changed since
+    the last frame are drawn, their rectangles are returned for p.display.update
     '''
-    drawBoard(screen)
-    highlight_squares(screen, gs, validMoves, sq_selected)
-    drawPieces(screen, gs.board)
+    marked = highlight_squares(gs, validMoves, sq_selected)
+    dirty = []
+    for r in range(Dimension):
+        for c in range(Dimension):
+            look = (gs.board[r][c], marked.get((r, c)))
+            if on_screen[r*8 + c] != look:
+                on_screen[r*8 + c] = look
+                dirty.append(drawSquare(screen, r, c, *look))
+    return dirty
+
+def drawSquare(screen, r, c, piece, highlight=None):
+    '''
+    draw one square from the cached board with its highlight and piece, returns its rectangle
+    '''
+    square = p.Rect(c*square_size, r*square_size, square_size, square_size)
+    screen.blit(board_surface, square, square)
+    if highlight is not None:
+        screen.blit(highlights[highlight], square)
+    if piece != "--":
+        screen.blit(images[piece], square)
+    return square
 
 def drawBoard(screen):
     '''
     draw the squares of the board
     '''
-    global colors
-    colors = [p.Color('white'), p.Color('gray')]
     for r in range(Dimension):
         for c in range(Dimension):
             color = colors[((r+c)%2)]
@@ -161,37 +298,58 @@ def drawPieces(screen, board):
 
 def animateMove(move, screen, board, clock):
     '''
-    animate the move
+    animate the move. The board behind the moving piece is drawn once, each frame only puts back the rectangle the
+    piece left and draws it in its new one
     '''
-    global colors
-
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
     framePerSquare = 5 # frames to move one squares
     frameCount = (abs(dR) + abs(dC))*framePerSquare
+    # the position after the move, but with the captured piece (if any) still on the end square
+    endSquare = p.Rect(move.endCol*square_size, move.endRow*square_size, square_size, square_size)
+    background = board_surface.copy()
+    drawPieces(background, board)
+    background.blit(board_surface, endSquare, endSquare)
+    if move.pieceCaptured != '--':
+        background.blit(images[move.pieceCaptured], endSquare)
+    dirty = []
+    for r in range(Dimension):
+        for c in range(Dimension):
+            look = (board[r][c] if (r, c) != (move.endRow, move.endCol) else move.pieceCaptured, None)
+            if on_screen[r*8 + c] != look:
+                on_screen[r*8 + c] = look
+                square = p.Rect(c*square_size, r*square_size, square_size, square_size)
+                screen.blit(background, square, square)
+                dirty.append(square)
+    previous = None
     for frame in range(frameCount + 1):
         r, c = (move.startRow + dR * frame/frameCount, move.startCol + dC * frame/frameCount)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # erase the piece moved from its ending square
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol*square_size, move.endRow*square_size, square_size, square_size)
-        p.draw.rect(screen, color, endSquare)
-        # draw captured piece onto rectangle
-        if move.pieceCaptured != '--':
-            screen.blit(images[move.pieceCaptured], endSquare)
-        screen.blit(images[move.pieceMoved], p.Rect(c*square_size, r*square_size, square_size, square_size))
-        p.display.flip()
+        sprite = p.Rect(c*square_size, r*square_size, square_size, square_size)
+        if previous is not None:
+            screen.blit(background, previous, previous)
+            dirty.append(previous)
+        screen.blit(images[move.pieceMoved], sprite)
+        dirty.append(sprite)
+        p.display.update(dirty)
+        dirty = []
+        previous = sprite
         clock.tick(60)
+    on_screen[move.endRow*8 + move.endCol] = None # the moved piece is drawn over the captured one, draw it again
 
 
 def drawText(screen, txt):
-    font = p.font.SysFont('Helvitca', 32,True, False)
+    '''
+    draw txt in the middle of the board, returns the rectangle it covers
+    '''
+    if 'text' not in fonts:
+        fonts['text'] = p.font.SysFont('Helvitca', 32,True, False)
+    font = fonts['text']
     textObject = font.render(txt, 0, p.Color('Gray'))
     textlocation = p.Rect(0,0, width, height).move(width/2 - textObject.get_width()/2, height/2 - textObject.get_height()/2)
     screen.blit(textObject, textlocation)
     textObject = font.render(txt, 0, p.Color('Black'))
     screen.blit(textObject, textlocation)
+    return p.Rect(textlocation.topleft, textObject.get_size())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
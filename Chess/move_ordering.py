@@ -0,0 +1,77 @@
+"""
+Move ordering for the search. Moves are handed out lazily in stages, best candidates first, so a node that fails high
+on an early move never pays for scoring and sorting the rest:
+    1. the hash move (best move stored in the transposition table, or the previous principal variation)
+    2. captures, most valuable victim / least valuable attacker first
+    3. killer moves, quiet moves that caused a cutoff at the same ply elsewhere in the tree
+    4. the remaining quiet moves by history score
+"""
+
+MVV_LVA_VALUE = {'p': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 10}
+KILLER_SLOTS = 2
+
+
+def mvv_lva(move):
+    """capture score: the victim's value dominates, a cheaper attacker breaks ties"""
+    return MVV_LVA_VALUE[move.pieceCaptured[1]] * 16 - MVV_LVA_VALUE[move.pieceMoved[1]]
+
+
+def history_index(move):
+    return move.moveId & 4095  # start square and end square
+
+
+class MoveOrderer():
+    def __init__(self, max_ply=64):
+        self.max_ply = max_ply
+        self.killers = [[0] * KILLER_SLOTS for _ in range(max_ply + 1)]  # move ids, per ply
+        self.history = [0] * (64 * 64)  # indexed by start square + end square * 64
+
+    def new_search(self):
+        """killers are only meaningful within one search, history is halved so old results fade"""
+        self.killers = [[0] * KILLER_SLOTS for _ in range(self.max_ply + 1)]
+        self.history = [h >> 1 for h in self.history]
+
+    def order_moves(self, moves, hash_move_id=0, ply=0):
+        """
+        yield moves in staged best-first order
+        """
+        captures = []
+        quiets = []
+        for move in moves:
+            if move.moveId == hash_move_id:
+                yield move
+            elif move.pieceCaptured != '--':
+                captures.append(move)
+            else:
+                quiets.append(move)
+        if captures:
+            captures.sort(key=mvv_lva, reverse=True)
+            yield from captures
+        killers = self.killers[ply] if ply <= self.max_ply else ()
+        for killer_id in killers:
+            for i in range(len(quiets)):
+                if quiets[i].moveId == killer_id:
+                    yield quiets.pop(i)
+                    break
+        if quiets:
+            history = self.history
+            quiets.sort(key=lambda m: history[history_index(m)], reverse=True)
+            yield from quiets
+
+    def order_captures(self, moves):
+        """captures, then promotions without a capture, for the quiescence search. Other quiet moves are dropped"""
+        captures = [move for move in moves if move.pieceCaptured != '--']
+        captures.sort(key=mvv_lva, reverse=True)
+        captures.extend(move for move in moves if move.pieceCaptured == '--' and move.moveId >> 12)
+        return captures
+
+    def record_cutoff(self, move, ply, depth):
+        """a quiet move caused a beta cutoff: remember it as a killer and reward it in the history table"""
+        if move.pieceCaptured != '--':
+            return
+        if ply <= self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move.moveId:
+                killers[1:] = killers[:-1]
+                killers[0] = move.moveId
+        self.history[history_index(move)] += depth * depth
@@ -0,0 +1,105 @@
+"""
+Lazy SMP search on several cores. Every worker process searches the same root position with its own iterative
+deepening, all of them sharing one transposition table in shared memory: what one worker stores, the others find, so
+between them they cover the tree faster than one search would. Every other helper starts a depth higher, which
+staggers the workers across depths instead of having them search the same nodes in lock step.
+
+Positions are sent to the workers as the FEN at the last capture or pawn move plus the moves played since, which
+the worker replays so that repetitions of the game are still seen. The principal variations come back in long
+algebraic notation, so nothing bigger than a string crosses a process boundary. The worker that started at depth 1
+decides when the search is over; the result of the deepest finished iteration across all workers is played.
+"""
+import multiprocessing
+from multiprocessing.sharedctypes import RawValue
+
+from Chess.chessEngine import Gamestate
+from Chess.SmartMoves import Search
+from Chess.tablebase import Tablebases
+from Chess.transposition import GENERATIONS, TranspositionTable
+
+_worker_search = None  # the Search in a worker process, set up once by init_worker
+
+
+def init_worker(tt, stop_flag, tablebase_path=None):
+    global _worker_search
+    _worker_search = Search(tt=tt)
+    _worker_search.stop_flag = stop_flag
+    if tablebase_path:  # every worker maps the table files itself, the pages are shared through the OS cache
+        _worker_search.tablebases = Tablebases(tablebase_path)
+
+
+def position_with_history(gs):
+    """
+    the FEN at the last move that can't repeat and the moves played since, in long algebraic notation. The moves are
+    taken back to read the FEN and played again, gs is left as it was
+    """
+    moves = []
+    plies = gs.halfmove_clock
+    while len(moves) < plies and gs.movelog and gs.movelog[-1] is not None:
+        moves.append(gs.movelog[-1])
+        gs.undo_move()
+    fen = gs.to_fen()
+    for move in reversed(moves):
+        gs.make_move(move)
+    return fen, [move.get_chess_notation() for move in reversed(moves)]
+
+
+def search_task(fen, history, depth, time_ms, start_depth, generation):
+    """
+    run in a worker: search the position reached by playing history from fen, returns (pv in long algebraic notation,
+    score, completed depth, nodes)
+    """
+    search = _worker_search
+    search.tt.generation = (generation - 1) % GENERATIONS  # search() steps it on to the generation of this move
+    gs = Gamestate.from_fen(fen)
+    for notation in history:
+        gs.make_move(gs.parse_move(notation))
+    best_move, score, pv = search.search(gs, gs.get_valid_moves(), depth, time_ms, start_depth=start_depth)
+    return [move.get_chess_notation() for move in pv], score, search.completed_depth, search.nodes
+
+
+class ParallelSearch():
+    """
+    Lazy SMP over a pool of worker processes, a drop in for Search.search. The pool and the shared table are kept
+    from one search to the next, call close() when done with it
+    """
+    def __init__(self, workers=None, tt_size_mb=16, tablebase_path=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.tt = TranspositionTable(tt_size_mb, shared=True)
+        self.stop_flag = RawValue('b', 0)
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker,
+                                         initargs=(self.tt, self.stop_flag, tablebase_path))
+        self.nodes = 0
+        self.completed_depth = 0
+
+    def stop(self):
+        self.stop_flag.value = 1
+
+    def search(self, gs, validMoves, depth=None, time_ms=None):
+        """returns the best move, its score and the principal variation, like Search.search"""
+        self.tt.new_search()
+        self.stop_flag.value = 0
+        fen, history = position_with_history(gs)
+        tasks = [self.pool.apply_async(search_task, (fen, history, depth, time_ms, 1 + helper % 2, self.tt.generation))
+                 for helper in range(self.workers)]
+        results = [tasks[0].get()]
+        self.stop_flag.value = 1  # the main worker is done, the helpers finish as soon as they notice
+        results += [task.get() for task in tasks[1:]]
+        self.nodes = sum(result[3] for result in results)
+        # deepest completed iteration wins, the main worker on a tie
+        pv_notation, score, self.completed_depth, _ = max(results, key=lambda result: result[2] if result[0] else -1)
+        pv = []
+        line = Gamestate.from_fen(gs.to_fen())
+        for notation in pv_notation:
+            move = line.parse_move(notation)
+            if move is None:
+                break
+            pv.append(move)
+            line.make_move(move)
+        # hand back the caller's own Move object for the best move
+        best_move = next((move for move in validMoves if pv and move == pv[0]), validMoves[0] if validMoves else None)
+        return best_move, score, pv
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
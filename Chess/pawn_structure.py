@@ -0,0 +1,99 @@
+"""
+Pawn structure evaluation: passed, doubled, isolated and backward pawns. The terms depend on nothing but where the
+pawns stand, and pawns move rarely within a search tree, so the result is cached in a PawnHashTable keyed on the
+pawn-only Zobrist key (Gamestate.pawn_hash) and most positions find it there instead of recomputing it.
+
+Scores are (middlegame, endgame) pairs in centipawns from white's point of view, tapered by the caller.
+"""
+from array import array
+
+from Chess.bitboards import FILE_A, iter_bits, pawn_attacks
+
+# bonus for a passed pawn by how far it has advanced, 0 on its start rank up to 5 one step from promoting
+PASSED_MG = (0, 5, 10, 20, 35, 60)
+PASSED_EG = (0, 10, 20, 40, 70, 120)
+DOUBLED_MG, DOUBLED_EG = -10, -20  # for each pawn beyond the first on a file
+ISOLATED_MG, ISOLATED_EG = -10, -15  # no friendly pawn on either neighbouring file
+BACKWARD_MG, BACKWARD_EG = -8, -10  # behind its neighbours and can't advance safely
+
+FILES = [FILE_A << f for f in range(8)]
+ADJACENT_FILES = [(FILES[f - 1] if f > 0 else 0) | (FILES[f + 1] if f < 7 else 0) for f in range(8)]
+
+
+def rows_ahead(color, row):
+    """bitboard of the rows in front of row for color, white moves towards row 0"""
+    if color == 'w':
+        return (1 << (row * 8)) - 1
+    return ((1 << 64) - 1) ^ ((1 << ((row + 1) * 8)) - 1)
+
+
+# squares that must be free of enemy pawns for a pawn to be passed: in front of it on its own and neighbouring files
+PASSED_MASKS = {color: [rows_ahead(color, sq >> 3) & (FILES[sq & 7] | ADJACENT_FILES[sq & 7]) for sq in range(64)]
+                for color in 'wb'}
+# squares a friendly pawn could support it from: neighbouring files, level with it or behind
+SUPPORT_MASKS = {color: [~rows_ahead(color, sq >> 3) & ADJACENT_FILES[sq & 7] for sq in range(64)]
+                 for color in 'wb'}
+
+
+def evaluate_side(color, own, enemy):
+    """(middlegame, endgame) score of color's pawns"""
+    mg = eg = 0
+    enemy_attacks = pawn_attacks(enemy, 'b' if color == 'w' else 'w')
+    passed_masks = PASSED_MASKS[color]
+    support_masks = SUPPORT_MASKS[color]
+    for f in range(8):
+        count = bin(own & FILES[f]).count('1')
+        if count > 1:
+            mg += DOUBLED_MG * (count - 1)
+            eg += DOUBLED_EG * (count - 1)
+    for sq in iter_bits(own):
+        f = sq & 7
+        # no enemy pawn can stop it, and it isn't the rear pawn of a doubled pair
+        if not passed_masks[sq] & enemy and not passed_masks[sq] & own & FILES[f]:
+            advanced = 6 - (sq >> 3) if color == 'w' else (sq >> 3) - 1
+            mg += PASSED_MG[advanced]
+            eg += PASSED_EG[advanced]
+        if not own & ADJACENT_FILES[f]:
+            mg += ISOLATED_MG
+            eg += ISOLATED_EG
+        elif not own & support_masks[sq]:
+            stop = sq - 8 if color == 'w' else sq + 8
+            if enemy_attacks >> stop & 1:
+                mg += BACKWARD_MG
+                eg += BACKWARD_EG
+    return mg, eg
+
+
+def evaluate_pawns(white_pawns, black_pawns):
+    """(middlegame, endgame) pawn structure score from white's point of view"""
+    white_mg, white_eg = evaluate_side('w', white_pawns, black_pawns)
+    black_mg, black_eg = evaluate_side('b', black_pawns, white_pawns)
+    return white_mg - black_mg, white_eg - black_eg
+
+
+class PawnHashTable():
+    """
+    fixed number of entries, indexed by the low bits of the pawn key, a new entry always replaces the old one
+    """
+    def __init__(self, size_kb=256):
+        entries = max(1, size_kb * 1024 // 24)  # a key, a middlegame and an endgame score of 8 bytes each
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', [0]) * self.size
+        self.mg = array('q', [0]) * self.size
+        self.eg = array('q', [0]) * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def score(self, key, white_pawns, black_pawns):
+        """(middlegame, endgame) score of the pawn structure, from the table or computed and stored"""
+        i = key & self.mask
+        self.probes += 1
+        if self.keys[i] == key:
+            self.hits += 1
+            return self.mg[i], self.eg[i]
+        mg, eg = evaluate_pawns(white_pawns, black_pawns)
+        self.keys[i] = key
+        self.mg[i] = mg
+        self.eg[i] = eg
+        return mg, eg
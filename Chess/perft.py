@@ -0,0 +1,216 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth and compares them with published reference counts.
+Any bug in move generation or make/undo shows up as a wrong count, and the nodes per second make it the benchmark for
+move generation speed.
+
+    python -m Chess.perft                      run the reference suite at its default depths
+    python -m Chess.perft --depth 5            run the suite deeper (up to the depth the counts are known for)
+    python -m Chess.perft --fen "<fen>" --depth 3 --divide
+                                               node count per root move, to find where a count goes wrong
+    python -m Chess.perft --consistency        random games checking the incrementally kept state against the same
+                                               computed from scratch, and the suite counted over pseudo legal moves
+"""
+import argparse
+import random
+import sys
+import time
+
+from Chess.bitboards import PIECES
+from Chess.chessEngine import Gamestate
+from Chess.evaluation import evaluate_from_scratch
+from Chess.zobrist import hash_position, pawn_hash_position
+
+# name, FEN, node counts for depth 1, 2, ..., default depth to run
+REFERENCE_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609], 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603], 3),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624], 4),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333], 3),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487], 3),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594], 3),
+]
+CONSISTENCY_GAMES = 24
+CONSISTENCY_PLIES = 300  # longer than the undo stack starts out, so it has to grow
+NULL_MOVE_RATE = 0.05  # share of the random moves that are null moves, as the search plays them
+
+
+def perft(gs, depth):
+    """number of leaf nodes depth plies below the position, the last ply is counted without being played"""
+    moves = gs.get_valid_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def pseudo_perft(gs, depth):
+    """perft over pseudo legal moves tested with is_legal, the way the search generates them, has to match perft"""
+    in_check = gs.king_in_check()
+    moves = [move for move in gs.pseudo_legal_moves() if gs.is_legal(move, in_check)]
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += pseudo_perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs, depth):
+    """perft split by root move: a list of (move notation, node count)"""
+    counts = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts.append((move.get_chess_notation(), perft(gs, depth - 1)))
+        gs.undo_move()
+    return counts
+
+
+def run_suite(max_depth=None, out=sys.stdout, count=perft):
+    """
+    run every reference position to its default depth (or max_depth), returns True if every count matched. count is
+    perft or pseudo_perft
+    """
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected, default_depth in REFERENCE_POSITIONS:
+        depth = min(max_depth or default_depth, len(expected))
+        for d in range(1, depth + 1):
+            gs = Gamestate.from_fen(fen)
+            start = time.perf_counter()
+            nodes = count(gs, d)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            passed = nodes == expected[d - 1]
+            all_passed = all_passed and passed
+            print(f"{name:<10} depth {d}  {nodes:>9} nodes  {elapsed:8.3f}s  {nodes / max(elapsed, 1e-9):>9.0f} nps  "
+                  f"{'ok' if passed else 'FAIL, expected ' + str(expected[d - 1])}", file=out)
+    print(f"total {total_nodes} nodes in {total_time:.3f}s, {total_nodes / max(total_time, 1e-9):.0f} nps", file=out)
+    return all_passed
+
+
+def state_errors(gs):
+    """the parts of the incrementally kept state that differ from the same computed from scratch"""
+    errors = []
+    if gs.hash != hash_position(gs):
+        errors.append("hash")
+    if gs.pawn_hash != pawn_hash_position(gs):
+        errors.append("pawn hash")
+    if (gs.mg_score, gs.eg_score, gs.phase) != evaluate_from_scratch(gs.board):
+        errors.append("evaluation terms")
+    bitboards = {piece: 0 for piece in PIECES}
+    for sq in range(64):
+        piece = gs.board[sq >> 3][sq & 7]
+        if piece != "--":
+            bitboards[piece] |= 1 << sq
+    if bitboards != gs.bitboards or gs.occupied != sum(bitboards.values()):
+        errors.append("bitboards")
+    return errors
+
+
+def position_errors(gs, moves, hashes):
+    """
+    state_errors, plus the move generators and repetitions checked the slow way: moves are the legal moves and hashes
+    those of the positions since the last null move
+    """
+    errors = state_errors(gs)
+    in_check = gs.king_in_check()
+    legal = {move.moveId for move in moves}
+    if {move.moveId for move in gs.pseudo_legal_moves() if gs.is_legal(move, in_check)} != legal:
+        errors.append("pseudo legal moves")
+    if not in_check:
+        captures = {move.moveId for move in gs.capture_moves() if gs.is_legal(move, False)}
+        if captures != {move.moveId for move in moves if move.pieceCaptured != '--' or move.moveId >> 12 == 4}:
+            errors.append("capture moves")
+    if gs.repetitions() != hashes[:-1].count(gs.hash):
+        errors.append("repetitions")
+    return errors
+
+
+def check_consistency(games=CONSISTENCY_GAMES, plies=CONSISTENCY_PLIES, seed=1, out=sys.stdout):
+    """
+    play random games from the reference positions, null moves included, checking every position on the way with
+    position_errors, then take each game back checking every position comes back as it was. Returns True if all agree
+    """
+    rng = random.Random(seed)
+    checked = failures = 0
+    for game in range(games):
+        name, fen, _, _ = REFERENCE_POSITIONS[game % len(REFERENCE_POSITIONS)]
+        gs = Gamestate.from_fen(fen)
+        played = [(gs.to_fen(), gs.hash)]
+        hashes = [gs.hash]
+        for ply in range(plies):
+            moves = gs.get_valid_moves()
+            errors = position_errors(gs, moves, hashes)
+            checked += 1
+            if errors:
+                failures += 1
+                print(f"{name} game {game} ply {ply}: {', '.join(errors)} wrong in {gs.to_fen()}", file=out)
+            if not moves:
+                break
+            if rng.random() < NULL_MOVE_RATE and not gs.inCheck:
+                gs.make_null_move()
+                hashes = []
+            else:
+                gs.make_move(rng.choice(moves))
+            played.append((gs.to_fen(), gs.hash))
+            hashes.append(gs.hash)
+        while gs.movelog:
+            gs.undo_move()
+            played.pop()
+            errors = state_errors(gs)
+            if (gs.to_fen(), gs.hash) != played[-1]:
+                errors.append("undo")
+            checked += 1
+            if errors:
+                failures += 1
+                print(f"{name} game {game} undo to ply {len(played) - 1}: {', '.join(errors)} wrong in "
+                      f"{gs.to_fen()}", file=out)
+    print(f"consistency: {checked} positions checked, {failures} wrong", file=out)
+    return failures == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="perft node counts for the move generator")
+    parser.add_argument("--depth", type=int, help="depth to search (default: the suite's depth for each position)")
+    parser.add_argument("--fen", help="count this position instead of running the reference suite")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--consistency", action="store_true",
+                        help="check the incremental state in random games, and the suite over pseudo legal moves")
+    args = parser.parse_args(argv)
+
+    if args.consistency:
+        consistent = check_consistency()
+        return 0 if run_suite(args.depth, count=pseudo_perft) and consistent else 1
+    if args.fen is None:
+        return 0 if run_suite(args.depth) else 1
+    gs = Gamestate.from_fen(args.fen)
+    depth = args.depth or 1
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, depth)
+        for notation, nodes in counts:
+            print(f"{notation}: {nodes}")
+        nodes = sum(nodes for _, nodes in counts)
+    else:
+        nodes = perft(gs, depth)
+    elapsed = time.perf_counter() - start
+    print(f"depth {depth}: {nodes} nodes in {elapsed:.3f}s, {nodes / max(elapsed, 1e-9):.0f} nps")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Minimal PGN reading: the games of a file as their tags and movetext, and the moves of a game's movetext. Comments,
+variations, annotation glyphs and move numbers are skipped.
+"""
+import itertools
+import re
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+def read_games(lines):
+    """yield (tags, movetext) for each game, tags is a dict of the tag pairs"""
+    tags = {}
+    movetext = []
+    for line in itertools.chain(lines, ['[End ""]']):  # the sentinel tag flushes the last game
+        line = line.strip()
+        if line.startswith('['):
+            if movetext:
+                yield tags, "\n".join(movetext)
+                tags = {}
+                movetext = []
+            tag = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if tag:
+                tags[tag.group(1)] = tag.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+
+
+def game_moves(gs, movetext):
+    """
+    yield the moves of the movetext in turn, each parsed in gs. The caller plays every move on gs before asking for
+    the next one. Stops at the result, or at a move that isn't legal
+    """
+    movetext = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', movetext)
+    while '(' in movetext:
+        movetext = re.sub(r'\([^()]*\)', ' ', movetext)
+    for token in re.findall(r'[^\s.]+', re.sub(r'\d+\.(\.\.)?|\$\d+', ' ', movetext)):
+        if token in RESULTS:
+            return
+        move = gs.parse_san(token)
+        if move is None:
+            return
+        yield move
@@ -0,0 +1,164 @@
+"""
+Search statistics, for tuning move ordering and pruning: node counts, transposition table hit rate, beta cutoffs and how
+often the first move tried caused them, the effective branching factor of each iteration, and the time spent in move
+generation, evaluation and make/undo.
+
+Collection is off unless a SearchStats is set as Search.stats, and costs nothing then: the timers are wrappers put on
+the Gamestate, the search's evaluate and the table's probe for the length of one search, and the counters the search
+keeps itself are behind a single test per quiescence node and per cutoff. The times include the wrappers' own
+overhead, so they are for comparing one part against another rather than absolute.
+
+    python -m Chess.search_stats --depth 5 --fen "<fen>"
+    python -m Chess.search_stats --depth 5 --disable null_move late_move_reductions
+"""
+import argparse
+import json
+import sys
+import time
+
+from Chess.chessEngine import STARTING_FEN, Gamestate
+from Chess.SmartMoves import Search
+
+TIMED_METHODS = (  # (object, method name, bucket)
+    ('gs', 'get_valid_moves', 'movegen'),
+    ('gs', 'pseudo_legal_moves', 'movegen'),
+    ('gs', 'capture_moves', 'movegen'),
+    ('gs', 'is_legal', 'movegen'),
+    ('gs', 'make_move', 'make_undo'),
+    ('gs', 'undo_move', 'make_undo'),
+    ('search', 'evaluate', 'evaluation'),
+)
+# the Search attributes that switch the selective parts of the search, for measuring what each one saves
+SELECTIVE_SEARCH = ('null_move', 'late_move_reductions', 'futility_pruning', 'delta_pruning', 'check_extensions')
+
+
+class SearchStats():
+    """the numbers of the last search, reset when the next one starts"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.times = {'movegen': 0.0, 'evaluation': 0.0, 'make_undo': 0.0}
+        self.iterations = []  # per completed iteration: depth, nodes, time_ms and effective branching factor
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        self.timing = False  # inside a timed call, so calls it makes aren't counted twice
+        self.wrapped = []
+
+    def timed(self, function, bucket):
+        def wrapper(*args, **kwargs):
+            if self.timing:
+                return function(*args, **kwargs)
+            self.timing = True
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[bucket] += time.perf_counter() - start
+                self.timing = False
+        return wrapper
+
+    def counted_probe(self, probe):
+        def wrapper(key):
+            entry = probe(key)
+            self.tt_probes += 1
+            if entry is not None:
+                self.tt_hits += 1
+            return entry
+        return wrapper
+
+    def start_search(self, search, gs):
+        """reset, and wrap the timed methods of this search and position"""
+        self.reset()
+        owners = {'gs': gs, 'search': search}
+        for owner, name, bucket in TIMED_METHODS:
+            setattr(owners[owner], name, self.timed(getattr(owners[owner], name), bucket))
+            self.wrapped.append((owners[owner], name))
+        search.tt.probe = self.counted_probe(search.tt.probe)
+        self.wrapped.append((search.tt, 'probe'))
+
+    def end_iteration(self, depth, nodes):
+        previous = self.iterations[-1]['nodes'] if self.iterations else 0
+        iteration_nodes = nodes - previous
+        ebf = None
+        if len(self.iterations) > 0 and self.iterations[-1]['iteration_nodes']:
+            ebf = round(iteration_nodes / self.iterations[-1]['iteration_nodes'], 2)
+        self.nodes = nodes
+        self.iterations.append({'depth': depth, 'nodes': nodes, 'iteration_nodes': iteration_nodes,
+                                'time_ms': round((time.perf_counter() - self.start) * 1000), 'ebf': ebf})
+
+    def end_search(self, nodes):
+        """take the wrappers off again, the methods of the class show through"""
+        for owner, name in self.wrapped:
+            delattr(owner, name)
+        self.wrapped = []
+        self.nodes = nodes
+        self.elapsed = time.perf_counter() - self.start
+
+    def cutoff(self, moves_tried):
+        self.cutoffs += 1
+        if moves_tried == 1:
+            self.first_move_cutoffs += 1
+
+    def as_dict(self):
+        elapsed = self.elapsed or time.perf_counter() - self.start
+        return {
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'time_ms': round(elapsed * 1000),
+            'nps': round(self.nodes / elapsed) if elapsed else 0,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_hit_rate': round(self.tt_hits / self.tt_probes, 3) if self.tt_probes else None,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': round(self.first_move_cutoffs / self.cutoffs, 3) if self.cutoffs else None,
+            'time_ms_by_part': {part: round(seconds * 1000) for part, seconds in self.times.items()},
+            'iterations': self.iterations,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict())
+
+    def summary(self):
+        """one line of the main numbers, for a UCI info string"""
+        stats = self.as_dict()
+        last = self.iterations[-1] if self.iterations else {}
+        parts = stats['time_ms_by_part']
+        return (f"depth {last.get('depth', 0)} ebf {last.get('ebf')} qnodes {self.qnodes} "
+                f"tthitrate {stats['tt_hit_rate']} cutoffs {self.cutoffs} "
+                f"firstmove {stats['first_move_cutoff_rate']} movegen_ms {parts['movegen']} "
+                f"eval_ms {parts['evaluation']} makeundo_ms {parts['make_undo']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="search a position and print the search statistics as JSON")
+    parser.add_argument("--fen", default=STARTING_FEN)
+    parser.add_argument("--depth", type=int, help="search depth (default 4 without --time-ms)")
+    parser.add_argument("--time-ms", type=int, help="search time in milliseconds")
+    parser.add_argument("--disable", nargs="+", default=[], choices=SELECTIVE_SEARCH, metavar="FEATURE",
+                        help="switch off parts of the selective search: " + ", ".join(SELECTIVE_SEARCH))
+    args = parser.parse_args(argv)
+
+    search = Search()
+    for feature in args.disable:
+        setattr(search, feature, False)
+    search.stats = SearchStats()
+    gs = Gamestate.from_fen(args.fen)
+    best_move, score, pv = search.search(gs, gs.get_valid_moves(), args.depth, args.time_ms)
+    result = search.stats.as_dict()
+    result['bestmove'] = best_move.get_chess_notation() if best_move else None
+    result['score'] = score
+    result['pv'] = " ".join(move.get_chess_notation() for move in pv)
+    result['disabled'] = args.disable
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,660 @@
+"""
+Endgame tablebases for positions of up to four pieces, kings included. A table holds the distance to mate in plies
+with best play for every placement of its pieces and either side to move, worked out by retrograde analysis: the
+checkmates are found first, then positions are resolved backwards one ply at a time by un-making moves, a position
+being lost once every one of its moves leads to a won position for the opponent. Captures and promotions leave the
+table, they are scored from the smaller table they lead to, which is generated first.
+
+Each table covers one material signature with the stronger side as white, named like KRvK or KQvKR; positions where
+black is the stronger side are looked up colour flipped. The white king is mirrored onto the a-d files (and ranks 5-8
+when there are no pawns) and the other pieces are indexed by square. Entries are bit packed at as few bits as the
+longest mate needs, and the files are memory mapped, so a probe costs a couple of byte reads. Castling and en passant
+are left out of the tables: positions with a castling right or an en passant square are not probed. The en passant
+captures are still played while a table is generated, so a double push is scored by what it really allows.
+
+    python -m Chess.tablebase generate tablebases               # every table of up to three pieces
+    python -m Chess.tablebase generate tablebases KQvKR KRvKP   # particular tables, with the ones they lead to
+    python -m Chess.tablebase probe tablebases "<fen>"
+    python -m Chess.tablebase verify tablebases KRvK
+"""
+import argparse
+import itertools
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+
+from Chess.attack_tables import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, \
+    rook_attacks
+from Chess.bitboards import PIECES, iter_bits, pop_count
+from Chess.chessEngine import ENPASSANT_FLAG, Gamestate
+
+MAX_PIECES = 4
+MAGIC = b'CTB1'
+HEADER = struct.Struct('>4sB')  # magic, bits per entry
+ORDER = 'QRBNP'  # strongest first, the order pieces are listed in a table name and indexed in
+SLIDER_ATTACKS = {'B': bishop_attacks, 'R': rook_attacks, 'Q': queen_attacks}
+ILLEGAL = 255  # move count of a placement that can't occur: pieces on top of each other, the wrong king in check
+EXTENSION = '.tb'
+
+# squares of each white king placement: the a-d files, and ranks 5-8 too when there are no pawns to fix the board
+KING_SQUARES = {pawns: [sq for sq in range(64) if sq & 7 < 4 and (pawns or sq >> 3 < 4)] for pawns in (False, True)}
+KING_INDEX = {pawns: [squares.index(sq) if sq in squares else -1 for sq in range(64)]
+              for pawns, squares in KING_SQUARES.items()}
+EMPTY_BOARD_ATTACKS = {piece_type: [attacks(sq, 0) for sq in range(64)] for piece_type, attacks in
+                       SLIDER_ATTACKS.items()}
+
+
+def table_name(white, black):
+    """KRvK style name from the letters of the pieces besides the kings"""
+    return 'K' + white + 'vK' + black
+
+
+def split_name(name):
+    """(white letters, black letters) of a table name, in ORDER"""
+    white, black = name.upper().split('V')
+    if not white.startswith('K') or not black.startswith('K') or any(letter not in ORDER for letter in white[1:] +
+                                                                        black[1:]):
+        raise ValueError(f"bad tablebase name {name!r}, expected something like KRvK or KQvKR")
+    return sort_letters(white[1:]), sort_letters(black[1:])
+
+
+def sort_letters(letters):
+    return ''.join(sorted(letters, key=ORDER.index))
+
+
+def strength(letters):
+    """more pieces is stronger, then the stronger pieces"""
+    return len(letters), [-ORDER.index(letter) for letter in letters]
+
+
+def canonical(white, black):
+    """(name of the table, True if the position has to be colour flipped to be found in it)"""
+    if strength(black) > strength(white):
+        return table_name(black, white), True
+    return table_name(white, black), False
+
+
+def table_pieces(white, black):
+    """engine piece strings in index order: the kings, then the white and the black pieces in ORDER"""
+    return (['wK', 'bK'] + ['w' + (letter if letter != 'P' else 'p') for letter in white] +
+            ['b' + (letter if letter != 'P' else 'p') for letter in black])
+
+
+def dependencies(name):
+    """the tables a capture or a promotion, or both at once, leads to out of this one"""
+    white, black = split_name(name)
+    results = set()
+    for mover, other, white_moves in ((white, black, True), (black, white, False)):
+        captured = [other] + [other[:i] + other[i + 1:] for i in range(len(other))]
+        promoted = [mover] + [sort_letters(mover.replace('P', '', 1) + letter) for letter in 'QRBN' if 'P' in mover]
+        for mover_after, other_after in itertools.product(promoted, captured):
+            if (mover_after, other_after) != (mover, other):
+                results.add(canonical(*((mover_after, other_after) if white_moves else (other_after, mover_after)))[0])
+    results.discard(table_name('', ''))
+    return sorted(results)
+
+
+def normalize(squares, pawns):
+    """the squares mirrored so the white king (squares[0]) stands on one of KING_SQUARES"""
+    flip = 7 if squares[0] & 7 >= 4 else 0
+    if not pawns and squares[0] >> 3 >= 4:
+        flip |= 56
+    return [sq ^ flip for sq in squares] if flip else squares
+
+
+def attacked(sq, pieces, squares, color, occupied):
+    """is sq attacked by a piece of color, pieces and squares being the placement"""
+    for piece, attacker in zip(pieces, squares):
+        if piece[0] != color or attacker < 0:
+            continue
+        piece_type = piece[1]
+        if piece_type == 'K':
+            hit = KING_ATTACKS[attacker] >> sq & 1
+        elif piece_type == 'N':
+            hit = KNIGHT_ATTACKS[attacker] >> sq & 1
+        elif piece_type == 'p':
+            hit = PAWN_ATTACKS[color][attacker] >> sq & 1
+        else:  # a slider reaches sq along an empty line
+            hit = EMPTY_BOARD_ATTACKS[piece_type][attacker] >> sq & 1 and not BETWEEN[attacker][sq] & occupied
+        if hit:
+            return True
+    return False
+
+
+def decode(value):
+    """(result, plies) of a stored value: result 1 when the side to move wins, -1 when it loses, 0 a draw"""
+    if value == 0:
+        return 0, 0
+    plies = value - 1
+    return (1 if plies & 1 else -1), plies
+
+
+def position_pieces(gs):
+    """(piece, square) of every piece on the board"""
+    return [(piece, sq) for piece in PIECES for sq in iter_bits(gs.bitboards[piece])]
+
+
+class Table():
+    """one memory mapped table file"""
+    def __init__(self, path, pieces):
+        self.pieces = pieces
+        self.pawns = any(piece[1] == 'p' for piece in pieces)
+        self.size = len(KING_SQUARES[self.pawns]) * 64 ** (len(pieces) - 1)
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase file")
+        self.mask = (1 << self.bits) - 1
+
+    def value(self, squares, black_to_move):
+        """stored value of the placement (squares in the table's piece order): 0 a draw, otherwise plies to mate + 1"""
+        squares = normalize(squares, self.pawns)
+        index = KING_INDEX[self.pawns][squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        bit = (black_to_move * self.size + index) * self.bits
+        offset = HEADER.size + (bit >> 3)
+        return int.from_bytes(self.data[offset:offset + 3], 'little') >> (bit & 7) & self.mask
+
+    def close(self):
+        self.data.close()
+
+
+class Tablebases():
+    """the tables found in a directory, opened the first time a position needs them"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}  # name to Table, or None when there is no file for it
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + EXTENSION)
+            self.tables[name] = Table(path, table_pieces(*split_name(name))) if os.path.exists(path) else None
+        return self.tables[name]
+
+    def value(self, pieces, white_to_move):
+        """
+        stored value for a list of (piece, square), 0 a draw and otherwise plies to mate + 1 (even when the side to
+        move wins), None when the table isn't there
+        """
+        white = sort_letters(''.join(piece[1].upper() for piece, _ in pieces if piece[0] == 'w' and piece[1] != 'K'))
+        black = sort_letters(''.join(piece[1].upper() for piece, _ in pieces if piece[0] == 'b' and piece[1] != 'K'))
+        if not white and not black:
+            return 0  # bare kings
+        name, flip = canonical(white, black)
+        table = self.table(name)
+        if table is None:
+            return None
+        if flip:
+            pieces = [(('b' if piece[0] == 'w' else 'w') + piece[1], sq ^ 56) for piece, sq in pieces]
+            white_to_move = not white_to_move
+        remaining = list(pieces)
+        squares = []
+        for piece in table.pieces:
+            for i, (other, sq) in enumerate(remaining):
+                if other == piece:
+                    squares.append(sq)
+                    del remaining[i]
+                    break
+        return table.value(squares, 0 if white_to_move else 1)
+
+    def probe(self, gs):
+        """
+        (result, plies) for the side to move, result 1 a win, -1 a loss and 0 a draw, plies the distance to mate. None
+        when the position isn't covered
+        """
+        if pop_count(gs.occupied) > MAX_PIECES or gs.enpassant_possible:
+            return None
+        rights = gs.current_castle_right
+        if rights.wks or rights.wqs or rights.bks or rights.bqs:
+            return None
+        value = self.value(position_pieces(gs), gs.white2move)
+        return None if value is None else decode(value)
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+def pseudo_moves(pieces, squares, color, occupied, own):
+    """
+    (slot, target square, slot of the captured piece or -1, promotion piece or None) for the moves of color's pieces,
+    own king safety not tested
+    """
+    for slot, (piece, sq) in enumerate(zip(pieces, squares)):
+        if piece[0] != color:
+            continue
+        piece_type = piece[1]
+        if piece_type == 'p':
+            step = -8 if color == 'w' else 8
+            push = sq + step
+            targets = PAWN_ATTACKS[color][sq] & occupied & ~own
+            if not occupied >> push & 1:
+                targets |= 1 << push
+                if sq >> 3 == (6 if color == 'w' else 1) and not occupied >> (push + step) & 1:
+                    targets |= 1 << (push + step)
+        elif piece_type == 'K':
+            targets = KING_ATTACKS[sq] & ~own
+        elif piece_type == 'N':
+            targets = KNIGHT_ATTACKS[sq] & ~own
+        else:
+            targets = SLIDER_ATTACKS[piece_type](sq, occupied) & ~own
+        for target in iter_bits(targets):
+            captured = squares.index(target) if occupied >> target & 1 else -1
+            if piece_type == 'p' and target >> 3 in (0, 7):
+                for promotion in 'QRBN':
+                    yield slot, target, captured, color + promotion
+            else:
+                yield slot, target, captured, None
+
+
+def unmoves(pieces, squares, color, occupied):
+    """the placements from which a move of color's, not a capture or a promotion, leads to squares"""
+    for slot, (piece, sq) in enumerate(zip(pieces, squares)):
+        if piece[0] != color:
+            continue
+        piece_type = piece[1]
+        if piece_type == 'p':
+            step = 8 if color == 'w' else -8  # back towards the pawn's own side
+            origin = sq + step
+            origins = 0
+            if 1 <= origin >> 3 <= 6 and not occupied >> origin & 1:
+                origins = 1 << origin
+                if (origin + step) >> 3 == (6 if color == 'w' else 1) and not occupied >> (origin + step) & 1:
+                    origins |= 1 << (origin + step)
+        elif piece_type == 'K':
+            origins = KING_ATTACKS[sq] & ~occupied
+        elif piece_type == 'N':
+            origins = KNIGHT_ATTACKS[sq] & ~occupied
+        else:
+            origins = SLIDER_ATTACKS[piece_type](sq, occupied) & ~occupied
+        for origin in iter_bits(origins):
+            before = list(squares)
+            before[slot] = origin
+            yield before
+
+
+def decode_index(index, n, pawns):
+    """the squares of the placement at index, the inverse of Table.value's indexing"""
+    squares = []
+    for _ in range(n - 1):
+        squares.append(index & 63)
+        index >>= 6
+    squares.append(KING_SQUARES[pawns][index])
+    return squares[::-1]
+
+
+def build_table(name, tablebases, log=None):
+    """
+    the values of every placement of the table, [white to move, black to move], by retrograde analysis. The tables
+    captures and promotions lead to have to be in tablebases already.
+
+    A double push next to an enemy pawn leads to a position where en passant is possible, which the placement alone
+    doesn't describe. Such a position is resolved as a node of its own, appended after the placements: it has the
+    moves of the placement plus the en passant captures, and its value is only passed on to the position before the
+    push. It isn't written to the table, positions with an en passant square aren't probed
+    """
+    white, black = split_name(name)
+    pieces = table_pieces(white, black)
+    pawns = 'P' in white + black
+    n = len(pieces)
+    size = len(KING_SQUARES[pawns]) * 64 ** (n - 1)
+    values = [array('H', bytes(2 * size)) for _ in range(2)]  # 0 until resolved (a draw if never), else plies + 1
+    counts = [bytearray(size) for _ in range(2)]  # moves staying in the table that aren't known to lose yet
+    escapes = [bytearray(size) for _ in range(2)]  # 1 when the position can't be lost: stalemate, a drawing exit
+    exit_losses = [array('H', bytes(2 * size)) for _ in range(2)]  # plies to mate of the longest losing exit
+    pending = {}  # plies to mate: [(side, index)] of the positions that resolve at that distance
+    en_passant = [{}, {}]  # node index past size: (index of the placement, slot of the pawn that double pushed)
+    en_passant_nodes = {}  # (side, index of the placement) to the indexes of its en passant nodes
+    start = time.perf_counter()
+
+    def exit_value(after_pieces, side):
+        value = tablebases.value(after_pieces, side == 1)
+        if value is None:
+            raise FileNotFoundError(f"{name} needs the tables it captures or promotes into, {dependencies(name)}, "
+                                    f"in {tablebases.directory}")
+        return value
+
+    def add_exit(value, exits):
+        """fold the value of a move leaving the table into exits: [escape, best win, longest loss]"""
+        if value == 0:
+            exits[0] = 1
+        elif value & 1:  # the opponent is mated value - 1 plies later, one more ply for this move
+            exits[1] = min(exits[1], value) if exits[1] else value
+        else:
+            exits[2] = max(exits[2], value)
+
+    def settle(side, index, legal, in_table, exits, in_check):
+        """record what the forward pass found for a position, and queue it if that already decides it"""
+        escape, best_win, longest_loss = exits
+        if not legal:
+            if in_check:
+                pending.setdefault(0, []).append((side, index))
+            else:
+                escapes[side][index] = 1  # stalemate
+            return
+        counts[side][index] = in_table
+        escapes[side][index] = escape or bool(best_win)
+        exit_losses[side][index] = longest_loss
+        if best_win:
+            pending.setdefault(best_win, []).append((side, index))
+        elif not in_table and not escape:
+            pending.setdefault(longest_loss, []).append((side, index))
+
+    # forward pass: checkmates, and the captures and promotions scored from the smaller tables
+    for side in (0, 1):
+        color, enemy = 'wb'[side], 'bw'[side]
+        own_slots = [slot for slot, piece in enumerate(pieces) if piece[0] == color]
+        own_pawns = [slot for slot in own_slots if pieces[slot][1] == 'p']
+        enemy_pawns = [slot for slot, piece in enumerate(pieces) if piece == enemy + 'p'] if own_pawns else []
+        landing_row, back = (4, 8) if enemy == 'w' else (3, -8)  # where a double push ends, towards its start
+        for index, squares in enumerate(itertools.product(KING_SQUARES[pawns], *[range(64)] * (n - 1))):
+            occupied = own = 0
+            for slot, sq in enumerate(squares):
+                occupied |= 1 << sq
+            for slot in own_slots:
+                own |= 1 << squares[slot]
+            if (pop_count(occupied) < n or any(piece[1] == 'p' and sq >> 3 in (0, 7) for piece, sq in
+                                               zip(pieces, squares)) or
+                    attacked(squares[1 - side], pieces, squares, color, occupied)):
+                counts[side][index] = ILLEGAL
+                continue
+            in_table = legal = 0
+            exits = [0, 0, 0]
+            for slot, target, captured, promotion in pseudo_moves(pieces, squares, color, occupied, own):
+                after = list(squares)
+                after[slot] = target
+                if captured >= 0:
+                    after[captured] = -1
+                if attacked(after[side], pieces, after, enemy, occupied & ~(1 << squares[slot]) | 1 << target):
+                    continue
+                legal = 1
+                if captured < 0 and promotion is None:
+                    in_table += 1
+                    continue
+                add_exit(exit_value([(promotion if promotion and i == slot else piece, sq)
+                                     for i, (piece, sq) in enumerate(zip(pieces, after)) if sq >= 0], side), exits)
+            in_check = not legal and attacked(squares[side], pieces, squares, enemy, occupied)
+            settle(side, index, legal, in_table, exits, in_check)
+
+            # the same placement straight after a double push of an enemy pawn, when it can be taken en passant
+            for pawn in enemy_pawns:
+                sq = squares[pawn]
+                if sq >> 3 != landing_row or occupied >> (sq + back) & 1 or occupied >> (sq + 2 * back) & 1:
+                    continue
+                ep_exits = list(exits)
+                captures = 0
+                for slot in own_pawns:
+                    if squares[slot] >> 3 != landing_row or abs((squares[slot] & 7) - (sq & 7)) != 1:
+                        continue
+                    after = list(squares)
+                    after[slot] = sq + back
+                    after[pawn] = -1
+                    if attacked(after[side], pieces, after, enemy,
+                                occupied & ~(1 << squares[slot] | 1 << sq) | 1 << (sq + back)):
+                        continue
+                    captures += 1
+                    add_exit(exit_value([(piece, sq) for piece, sq in zip(pieces, after) if sq >= 0], side),
+                             ep_exits)
+                if not captures:
+                    continue  # without a capture the position is just the placement
+                node = len(counts[side])
+                values[side].append(0)
+                counts[side].append(0)
+                escapes[side].append(0)
+                exit_losses[side].append(0)
+                en_passant[side][node] = (index, pawn)
+                en_passant_nodes.setdefault((side, index), []).append(node)
+                settle(side, node, True, in_table, ep_exits, False)
+    if log:
+        nodes = len(en_passant[0]) + len(en_passant[1])
+        log(f"{name}: forward pass {time.perf_counter() - start:.1f}s" +
+            (f", {nodes} en passant positions" if nodes else ""))
+
+    # backward pass, a ply at a time: a predecessor of a lost position is won one ply further from mate, and a
+    # predecessor all of whose moves lead to won positions is lost
+    plies = 0
+    while pending:
+        for side, index in pending.pop(plies, ()):
+            if values[side][index]:
+                continue
+            values[side][index] = plies + 1
+            other = 1 - side
+            color = 'wb'[other]
+            if index >= size:  # an en passant node, the only way into it is the double push
+                index, pawn = en_passant[side][index]
+                squares = decode_index(index, n, pawns)
+                before = list(squares)
+                before[pawn] += 16 if color == 'w' else -16
+                predecessors = [before]
+                pushed = ()
+            else:
+                squares = decode_index(index, n, pawns)
+                occupied = 0
+                for sq in squares:
+                    occupied |= 1 << sq
+                predecessors = unmoves(pieces, squares, color, occupied)
+                # a double push that allows en passant leads to the en passant node instead
+                pushed = {en_passant[side][node][1] for node in en_passant_nodes.get((side, index), ())}
+            for before in predecessors:
+                if pushed and any(before[pawn] - squares[pawn] in (16, -16) for pawn in pushed):
+                    continue
+                before_occupied = 0
+                for sq in before:
+                    before_occupied |= 1 << sq
+                if attacked(before[side], pieces, before, color, before_occupied):
+                    continue
+                before = normalize(before, pawns)
+                predecessor = KING_INDEX[pawns][before[0]]
+                for sq in before[1:]:
+                    predecessor = predecessor * 64 + sq
+                if counts[other][predecessor] == ILLEGAL:
+                    continue
+                # the en passant nodes of the predecessor have all of its moves too
+                for node in [predecessor] + en_passant_nodes.get((other, predecessor), []):
+                    if values[other][node]:
+                        continue
+                    if not plies & 1:  # this position is lost, so the move into it wins
+                        pending.setdefault(plies + 1, []).append((other, node))
+                    else:
+                        counts[other][node] -= 1
+                        if not counts[other][node] and not escapes[other][node]:
+                            loss = max(plies + 1, exit_losses[other][node])
+                            pending.setdefault(loss, []).append((other, node))
+        plies += 1
+    if log:
+        log(f"{name}: " + (f"longest mate {plies - 1} plies, " if plies else "no mates, ") +
+            f"{time.perf_counter() - start:.1f}s")
+    return [side_values[:size] for side_values in values]
+
+
+def write_table(path, values):
+    """bit pack the values at the fewest bits that hold the largest one"""
+    bits = max(1, max(max(side_values) for side_values in values).bit_length())
+    data = bytearray(HEADER.pack(MAGIC, bits))
+    acc = filled = 0
+    for side_values in values:
+        for value in side_values:
+            acc |= value << filled
+            filled += bits
+            while filled >= 8:
+                data.append(acc & 255)
+                acc >>= 8
+                filled -= 8
+    data.append(acc)
+    data += bytes(2)  # Table.value reads three bytes at a time
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def generate(name, directory, log=None):
+    """
+    write the table to the directory, after every table it leads to that isn't there yet. Returns the names of the
+    tables generated
+    """
+    generated = []
+    name = canonical(*split_name(name))[0]
+    if name == table_name('', ''):
+        return generated
+    for dependency in dependencies(name):
+        if not os.path.exists(os.path.join(directory, dependency + EXTENSION)):
+            generated += generate(dependency, directory, log)
+    os.makedirs(directory, exist_ok=True)
+    tablebases = Tablebases(directory)
+    try:
+        values = build_table(name, tablebases, log)
+    finally:
+        tablebases.close()
+    write_table(os.path.join(directory, name + EXTENSION), values)
+    return generated + [name]
+
+
+def all_tables(pieces):
+    """names of every table with up to pieces pieces, kings included"""
+    names = set()
+    for count in range(1, pieces - 1):
+        for letters in itertools.combinations_with_replacement(ORDER, count):
+            for split in range(count + 1):
+                for white in itertools.combinations(letters, split):
+                    black = list(letters)
+                    for letter in white:
+                        black.remove(letter)
+                    names.add(canonical(sort_letters(white), sort_letters(black))[0])
+    return sorted(names, key=lambda name: (len(name), name))
+
+
+def placement_fen(pieces, white_to_move):
+    """FEN of a list of (piece, square), no castling or en passant"""
+    board = [["--"] * 8 for _ in range(8)]
+    for piece, sq in pieces:
+        board[sq >> 3][sq & 7] = piece
+    gs = Gamestate()
+    gs.board = board
+    gs.white2move = white_to_move
+    gs.current_castle_right.wks = gs.current_castle_right.wqs = False
+    gs.current_castle_right.bks = gs.current_castle_right.bqs = False
+    return gs.to_fen()
+
+
+def from_children(children, in_check):
+    """(result, plies) of a position from the (result, plies) of the positions its legal moves lead to"""
+    losses = [plies for result, plies in children if result < 0]
+    if losses:
+        return 1, min(losses) + 1
+    if any(result == 0 for result, _ in children):
+        return 0, 0
+    if children:
+        return -1, max(plies for _, plies in children) + 1
+    return (-1, 0) if in_check else (0, 0)
+
+
+def position_value(gs, tablebases):
+    """
+    (result, plies) of the position for the side to move. The tables don't have the position straight after a double
+    push that can be taken en passant, that one is worked out from its moves
+    """
+    moves = gs.get_valid_moves()
+    if not any(move.flags & ENPASSANT_FLAG for move in moves):
+        return decode(tablebases.value(position_pieces(gs), gs.white2move))
+    children = []
+    for move in moves:
+        gs.make_move(move)
+        children.append(position_value(gs, tablebases))
+        gs.undo_move()
+    return from_children(children, gs.inCheck)
+
+
+def verify(name, directory, samples=1000, rng=random):
+    """
+    check the table against the engine's own move generation on random positions: the stored value of each has to
+    follow from the values of the positions its legal moves lead to. Returns the FENs that don't.
+    With pawns on both sides half of the positions have a pawn that can double push next to an enemy pawn, where en
+    passant decides the value of the move
+    """
+    tablebases = Tablebases(directory)
+    pieces = table_pieces(*split_name(name))
+    double_push = 'wp' in pieces and 'bp' in pieces
+    failures = []
+    checked = 0
+    while checked < samples:
+        squares = rng.sample(range(64), len(pieces))
+        white_to_move = rng.random() < 0.5
+        if double_push and rng.random() < 0.5:
+            pawn, enemy_pawn = ('wp', 'bp') if white_to_move else ('bp', 'wp')
+            col = rng.randrange(8)
+            enemy_col = col + rng.choice([offset for offset in (-1, 1) if 0 <= col + offset < 8])
+            squares[pieces.index(pawn)] = (48 if white_to_move else 8) + col
+            squares[pieces.index(enemy_pawn)] = (32 if white_to_move else 24) + enemy_col
+            if len(set(squares)) < len(squares):
+                continue
+        placement = list(zip(pieces, squares))
+        if any(piece[1] == 'p' and sq >> 3 in (0, 7) for piece, sq in placement):
+            continue
+        gs = Gamestate.from_fen(placement_fen(placement, white_to_move))
+        gs.white2move = not gs.white2move
+        opponent_in_check = gs.king_in_check()
+        gs.white2move = not gs.white2move
+        if opponent_in_check:
+            continue
+        checked += 1
+        children = []
+        for move in gs.get_valid_moves():
+            gs.make_move(move)
+            children.append(position_value(gs, tablebases))
+            gs.undo_move()
+        expected = from_children(children, gs.king_in_check())
+        if decode(tablebases.value(position_pieces(gs), gs.white2move)) != expected:
+            failures.append(gs.to_fen())
+    tablebases.close()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate, look up or check endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="generate tables and the tables they lead to")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("tables", nargs="*", help="names like KQvKR (default: every table up to 3 pieces)")
+    probe_parser = commands.add_parser("probe", help="look a position up")
+    probe_parser.add_argument("directory")
+    probe_parser.add_argument("fen")
+    verify_parser = commands.add_parser("verify", help="check a table against the move generator")
+    verify_parser.add_argument("directory")
+    verify_parser.add_argument("tables", nargs="+")
+    verify_parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for name in args.tables or all_tables(3):
+            if not os.path.exists(os.path.join(args.directory, canonical(*split_name(name))[0] + EXTENSION)):
+                generate(name, args.directory, print)
+    elif args.command == "probe":
+        tablebases = Tablebases(args.directory)
+        result = tablebases.probe(Gamestate.from_fen(args.fen))
+        if result is None:
+            print("not in the tablebases")
+        else:
+            print({1: "win", 0: "draw", -1: "loss"}[result[0]] + (f", mate in {result[1]} plies" if result[0] else ""))
+        tablebases.close()
+    else:
+        failed = False
+        for name in args.tables:
+            failures = verify(name, args.directory, args.samples)
+            print(f"{name}: {args.samples - len(failures)} of {args.samples} positions agree")
+            for fen in failures[:10]:
+                print(f"  {fen}")
+            failed = failed or bool(failures)
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Fixed size transposition table for the search. Storage is two preallocated arrays of 64 bit words sized from a memory
+budget in MB, so the table never grows however long a session runs. Entries are grouped in buckets of two: the first
+slot is depth-preferred and only gives way to a deeper search (or an entry left over from an earlier search), the
+second slot is always replaced.
+
+Each entry is a key word and a data word. The key word is stored xored with the data word so a torn entry, written
+half by one search and half by another, fails the key check instead of returning the wrong data. That is what lets a
+shared table (shared=True, the arrays live in shared memory) be used by several processes at once without locking.
+"""
+from array import array
+from multiprocessing.sharedctypes import RawArray
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+ENTRY_BYTES = 16  # one 64 bit key word and one 64 bit data word
+# data word layout: best move id in bits 0-23, score + SCORE_OFFSET in bits 24-43, depth in bits 44-51,
+# bound type in bits 52-53, search generation in bits 54-59
+SCORE_OFFSET = 1 << 19
+GENERATIONS = 64
+
+
+class TranspositionTable():
+    def __init__(self, size_mb=16, shared=False):
+        buckets = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_BYTES))
+        self.num_buckets = 1 << (buckets.bit_length() - 1)  # round down to a power of two so the index is a mask
+        self.mask = self.num_buckets - 1
+        self.shared = shared
+        if shared:
+            # the RawArrays are what child processes inherit, keys and data are fast typed views onto them
+            self.shared_keys = RawArray('Q', 2 * self.num_buckets)
+            self.shared_data = RawArray('Q', 2 * self.num_buckets)
+            self.attach()
+        else:
+            self.keys = array('Q', [0]) * (2 * self.num_buckets)
+            self.data = array('Q', [0]) * (2 * self.num_buckets)
+        self.generation = 0
+
+    def attach(self):
+        self.keys = memoryview(self.shared_keys).cast('B').cast('Q')
+        self.data = memoryview(self.shared_data).cast('B').cast('Q')
+
+    def __getstate__(self):
+        """a shared table is pickled as its RawArrays, which only works when handing it to a new process"""
+        state = self.__dict__.copy()
+        if self.shared:
+            del state['keys'], state['data']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared:
+            self.attach()
+
+    def new_search(self):
+        """age the table so entries from earlier searches are the first to be replaced"""
+        self.generation = (self.generation + 1) % GENERATIONS
+
+    def clear(self):
+        empty = array('Q', [0]) * (2 * self.num_buckets)
+        if self.shared:  # cleared in place, other processes hold views of the same memory
+            self.keys[:] = empty
+            self.data[:] = empty
+        else:
+            self.keys = empty
+            self.data = array('Q', empty)
+
+    def probe(self, key):
+        """
+        returns (depth, score, bound type, best move id) stored for the position, or None
+        """
+        i = (key & self.mask) << 1
+        for slot in (i, i + 1):
+            data = self.data[slot]
+            if self.keys[slot] ^ data == key:
+                return (data >> 44 & 0xFF, (data >> 24 & 0xFFFFF) - SCORE_OFFSET, data >> 52 & 0x3,
+                        data & 0xFFFFFF)
+        return None
+
+    def store(self, key, depth, score, bound, move_id):
+        data = (move_id | (score + SCORE_OFFSET) << 24 | depth << 44 | bound << 52 |
+                self.generation << 54)
+        i = (key & self.mask) << 1
+        old = self.data[i]
+        # the depth-preferred slot takes the entry if it is the same position, an equal or deeper search, or stale
+        if self.keys[i] ^ old == key or depth >= old >> 44 & 0xFF or old >> 54 & 0x3F != self.generation:
+            self.keys[i] = key ^ data
+            self.data[i] = data
+        else:
+            self.keys[i + 1] = key ^ data
+            self.data[i + 1] = data
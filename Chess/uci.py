@@ -0,0 +1,244 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be run from chess GUIs and tournament managers:
+
+    python -m Chess.uci
+
+Commands are read from stdin and answered on stdout. The search runs on a worker thread, so the main thread keeps
+reading and answers stop, isready and quit while it thinks.
+"""
+import os
+import sys
+import threading
+import time
+
+from Chess.book import OpeningBook
+from Chess.chessEngine import STARTING_FEN, Gamestate
+from Chess.parallel import ParallelSearch
+from Chess.search_stats import SearchStats
+from Chess.SmartMoves import MAX_PLY, Search, allocate_time, format_score
+from Chess.tablebase import Tablebases
+from Chess.transposition import TranspositionTable
+
+ENGINE_NAME = "Chess-Engine"
+ENGINE_AUTHOR = "kevin-00115"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+
+
+class UciEngine():
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.search = Search(DEFAULT_HASH_MB)
+        self.search.on_iteration = self.send_info
+        self.hash_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.parallel = None  # ParallelSearch used instead of self.search when Threads is above 1
+        self.tablebase_path = None
+        self.own_book = False
+        self.book = None
+        self.gs = Gamestate()
+        self.worker = None
+        self.stop_requested = threading.Event()  # set by stop (or quit), which an infinite search waits for
+        self.search_start = 0.0
+
+    def send(self, line):
+        with self.output_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, lines=sys.stdin):
+        """read commands until quit or the end of the input"""
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop_search()
+        if self.parallel is not None:
+            self.parallel.close()
+        if self.book is not None:
+            self.book.close()
+
+    def handle(self, line):
+        """carry out one command, returns False when the engine should exit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name OwnBook type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("option name Stats type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop_search()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.search.tt.clear()
+            if self.parallel is not None:
+                self.parallel.tt.clear()
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.go(args)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            return False
+        return True
+
+    def searcher(self):
+        return self.parallel if self.parallel is not None else self.search
+
+    def set_option(self, args):
+        """setoption name <name> value <value>"""
+        if "name" not in args:
+            return
+        value_at = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_at]).lower()
+        value = " ".join(args[value_at + 1:])
+        if name == "stats":  # search statistics as info strings, each iteration and as JSON after the search
+            self.search.stats = SearchStats() if value.lower() == "true" else None
+            return
+        if name == "ownbook":
+            self.own_book = value.lower() == "true"
+            return
+        if name == "bookfile":
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            if value and value != "<empty>":
+                try:
+                    self.book = OpeningBook(value)
+                except OSError as error:
+                    self.send(f"info string can't open book {value}: {error}")
+            return
+        try:
+            if name == "hash":
+                self.hash_mb = max(1, min(int(value), MAX_HASH_MB))
+                self.search.tt = TranspositionTable(self.hash_mb)
+            elif name == "threads":
+                self.threads = max(1, min(int(value), MAX_THREADS))
+            elif name == "tablebasepath":
+                self.tablebase_path = value if value and value != "<empty>" else None
+                if self.search.tablebases is not None:
+                    self.search.tablebases.close()
+                self.search.tablebases = Tablebases(self.tablebase_path) if self.tablebase_path else None
+                if self.tablebase_path and not os.path.isdir(self.tablebase_path):
+                    self.send(f"info string no tablebase directory {self.tablebase_path}")
+            else:
+                return
+        except ValueError:
+            self.send(f"info string bad value for option {name}: {value}")
+            return
+        # the worker processes are started again with the new table size or count
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+        if self.threads > 1:
+            self.parallel = ParallelSearch(self.threads, self.hash_mb, self.tablebase_path)
+
+    def set_position(self, args):
+        """position [startpos | fen <fen>] [moves <move1> ... <movei>]"""
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:moves_at])
+        else:
+            fen = STARTING_FEN
+        try:
+            gs = Gamestate.from_fen(fen)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        for notation in args[moves_at + 1:]:
+            move = gs.parse_move(notation)
+            if move is None:
+                self.send(f"info string illegal move {notation}")
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    def go(self, args):
+        """go [depth n] [movetime ms] [wtime ms btime ms [winc ms binc ms] [movestogo n]] [infinite]"""
+        limits = {}
+        for i in range(len(args) - 1):
+            if args[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+        depth = limits.get("depth")
+        time_ms = limits.get("movetime")
+        remaining_ms = limits.get("wtime" if self.gs.white2move else "btime")
+        if time_ms is None and remaining_ms is not None:
+            time_ms = allocate_time(remaining_ms, limits.get("winc" if self.gs.white2move else "binc", 0),
+                                    limits.get("movestogo"))
+        if depth is None and time_ms is None:  # infinite, or no limit given: search until stop
+            depth = MAX_PLY
+        self.stop_requested.clear()
+        self.worker = threading.Thread(target=self.think, args=(depth, time_ms, "infinite" in args), daemon=True)
+        self.worker.start()
+
+    def think(self, depth, time_ms, infinite=False):
+        """
+        worker thread: search the current position and report the best move. In infinite mode the bestmove isn't sent
+        before stop, even when the search ends by itself (a mate found, or nothing to search)
+        """
+        self.search_start = time.perf_counter()
+        bestmove = self.choose(depth, time_ms)
+        if infinite:
+            self.stop_requested.wait()
+        self.send(bestmove)
+
+    def choose(self, depth, time_ms):
+        """the bestmove line for the current position, from the book or a search"""
+        validMoves = self.gs.get_valid_moves()
+        if not validMoves:
+            return "bestmove 0000"
+        if self.own_book and self.book is not None:
+            book_move = self.book.choose_move(self.gs)
+            if book_move is not None:
+                return f"bestmove {book_move.get_chess_notation()}"
+        searcher = self.searcher()
+        best_move, score, pv = searcher.search(self.gs, validMoves, depth, time_ms)
+        if searcher is self.parallel:  # the workers can't report each iteration, sum up at the end instead
+            self.send_info(searcher.completed_depth, score, searcher.nodes, pv)
+        elif searcher.stats is not None:
+            self.send(f"info string stats {searcher.stats.to_json()}")
+        if len(pv) > 1:
+            return f"bestmove {best_move.get_chess_notation()} ponder {pv[1].get_chess_notation()}"
+        return f"bestmove {best_move.get_chess_notation()}"
+
+    def stop_search(self):
+        """stop a running search and wait for it to send its bestmove"""
+        if self.worker is not None:
+            self.stop_requested.set()
+            while self.worker.is_alive():  # repeated, the stop could land before the search has started
+                self.searcher().stop()
+                self.worker.join(0.01)
+            self.worker = None
+
+    def send_info(self, depth, score, nodes, pv):
+        elapsed_ms = max(1, int((time.perf_counter() - self.search_start) * 1000))
+        self.send(f"info depth {depth} score {format_score(score)} nodes {nodes} time {elapsed_ms} "
+                  f"nps {nodes * 1000 // elapsed_ms} pv {' '.join(move.get_chess_notation() for move in pv)}")
+        if self.searcher() is self.search and self.search.stats is not None:
+            self.send(f"info string {self.search.stats.summary()}")
+
+
+def main():
+    UciEngine().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Zobrist keys for hashing a position into a 64 bit integer. The hash is the xor of one random key per (piece, square),
+one per castling right still available, one for the file of the enpassant square and one when white is to move, so
+make_move can update it in O(1) by xoring only what changed.
+"""
+import random
+
+_rng = random.Random(0x5EED)  # fixed seed so the keys, and any stored hashes, are the same on every run
+
+PIECE_KEYS = {piece: [_rng.getrandbits(64) for _ in range(64)]
+              for piece in ("bp", "wp", "bN", "wN", "bB", "wB", "bR", "wR", "bQ", "wQ", "bK", "wK")}
+CASTLE_KEYS = {right: _rng.getrandbits(64) for right in ("wks", "wqs", "bks", "bqs")}
+# xor of the keys of the rights held, indexed by the castling bits: wks 1, wqs 2, bks 4, bqs 8
+CASTLE_BITS_KEYS = [(CASTLE_KEYS["wks"] if bits & 1 else 0) ^ (CASTLE_KEYS["wqs"] if bits & 2 else 0) ^
+                    (CASTLE_KEYS["bks"] if bits & 4 else 0) ^ (CASTLE_KEYS["bqs"] if bits & 8 else 0)
+                    for bits in range(16)]
+ENPASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]  # indexed by the file (column) of the enpassant square
+WHITE_TO_MOVE_KEY = _rng.getrandbits(64)
+
+
+def castle_key(bits):
+    """xor of the keys of every castling right still held, given as castling bits"""
+    return CASTLE_BITS_KEYS[bits]
+
+
+def enpassant_key(enpassant_possible):
+    return ENPASSANT_KEYS[enpassant_possible[1]] if enpassant_possible else 0
+
+
+def pawn_hash_position(gs):
+    """hash of the pawns alone, the key of the pawn structure cache"""
+    h = 0
+    for sq in range(64):
+        piece = gs.board[sq >> 3][sq & 7]
+        if piece in ("wp", "bp"):
+            h ^= PIECE_KEYS[piece][sq]
+    return h
+
+
+def hash_position(gs):
+    """the full hash of a Gamestate computed from scratch, used to initialise Gamestate.hash"""
+    h = 0
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece != "--":
+                h ^= PIECE_KEYS[piece][r * 8 + c]
+    if gs.white2move:
+        h ^= WHITE_TO_MOVE_KEY
+    return h ^ castle_key(gs.current_castle_right.bits) ^ enpassant_key(gs.enpassant_possible)